@@ -0,0 +1,231 @@
+"""
+积木的静态分析
+
+在脚本运行之前扫描project.json中的积木，得到运行时需要的信息。
+"""
+
+import json
+from collections import Counter
+
+ROOT_OPCODES = {"control_start_as_clone", "procedures_definition"}
+# 没有副作用、结果只由输入决定的运算积木；operator_random每次结果不同，不能折叠
+FOLDABLE_OPCODES = {
+    "operator_add", "operator_subtract", "operator_multiply", "operator_divide",
+    "operator_gt", "operator_lt", "operator_equals",
+    "operator_join", "operator_letter_of", "operator_length", "operator_contains",
+    "operator_mod", "operator_round",
+}
+LITERAL_TYPES = range(4, 11)  # 数字、正数、整数、角度、颜色、字符串
+
+SWITCH_COSTUME = {"looks_switchcostumeto": ("COSTUME", "looks_costume")}
+SWITCH_BACKDROP = {
+    "looks_switchbackdropto": ("BACKDROP", "looks_backdrops"),
+    "looks_switchbackdroptoandwait": ("BACKDROP", "looks_backdrops"),
+}
+NEXT_COSTUME = {"looks_nextcostume"}
+NEXT_BACKDROP = {"looks_nextbackdrop"}
+
+
+def _menu_literal(blocks: dict, block, input_name: str, menu_opcode: str):
+    """
+    取出菜单输入中的常量
+
+    返回:
+    str: 菜单中选中的名字；输入里放的是其他积木（值要运行时才知道）时返回None
+    """
+    value = block.inputs.get(input_name)
+    if not value or not isinstance(value[1], str):
+        return None
+    if value[0] == 3:
+        return None  # 菜单上盖了一个报告积木
+    menu = blocks.get(value[1])
+    if menu is None or menu.opcode != menu_opcode:
+        return None
+    field = menu.fields.get(input_name)
+    return field[0] if field else None
+
+
+def predict_costumes(target: dict, backdrops: dict) -> None:
+    """
+    根据脚本预测角色可能会切换到的造型
+
+    参数:
+    target: project.json中的一个角色字典（积木已转换为Block），结果直接写回
+    backdrops: 汇总所有角色切换背景积木的字典，
+               {"names": 写死的背景名集合, "sequential": 是否按顺序切换}
+
+    写入target的字段:
+    - predicted_costumes: 切换造型积木里写死的造型索引（排好序的列表）
+    - costume_sequential: 是否会按顺序切换（下一个造型、上一个造型、
+      随机造型或者运行时才知道的输入），为True时需要预取当前造型的前后造型
+
+    说明:
+    - 背景可以被任何角色切换，所以背景的预测汇总到backdrops中，
+      所有角色都处理完后再用costume_indices换算成舞台的造型索引
+    - 可以逐个角色调用，流式加载时不需要同时持有所有角色
+    """
+    names, sequential = set(), False
+    blocks = target["blocks"]
+    for block in blocks.values():
+        opcode = block.opcode
+        if opcode in NEXT_COSTUME:
+            sequential = True
+        elif opcode in NEXT_BACKDROP:
+            backdrops["sequential"] = True
+        elif opcode in SWITCH_COSTUME or opcode in SWITCH_BACKDROP:
+            is_costume = opcode in SWITCH_COSTUME
+            input_name, menu_opcode = (SWITCH_COSTUME if is_costume else SWITCH_BACKDROP)[opcode]
+            name = _menu_literal(blocks, block, input_name, menu_opcode)
+            kind = "costume" if is_costume else "backdrop"
+            if name is None or name in (f"next {kind}", f"previous {kind}", f"random {kind}"):
+                if is_costume:
+                    sequential = True
+                else:
+                    backdrops["sequential"] = True
+            elif is_costume:
+                names.add(name)
+            else:
+                backdrops["names"].add(name)
+    target["predicted_costumes"] = costume_indices(target["costumes"], names)
+    target["costume_sequential"] = sequential
+
+
+def costume_indices(costumes: list, names: set) -> list:
+    """把造型名转换为索引，找不到的名字（可能是编号）忽略"""
+    indices = set()
+    for index, costume in enumerate(costumes):
+        if costume["name"] in names:
+            indices.add(index)
+    return sorted(indices)
+
+
+def is_root(block) -> bool:
+    """判断积木是否是脚本的开头（帽子积木或者自定义积木的定义）"""
+    if block.parent is not None:
+        return False
+    return block.opcode in ROOT_OPCODES or "_when" in block.opcode
+
+
+def prune_unreachable(blocks: dict) -> Counter:
+    """
+    删除不会被执行的积木
+
+    参数:
+    blocks: 角色的积木字典（积木ID -> Block），原地修改
+
+    返回:
+    Counter: 被删除的积木按opcode计数
+
+    说明:
+    - 从帽子积木和自定义积木定义出发，沿next和输入中引用的积木ID遍历，
+      遍历不到的积木都删除：代码区里没有帽子的零散脚本、单独放着的报告积木等
+    - 输入被其他积木盖住时，下面的影子积木（输入的第三项）不会被执行，
+      也一起删除，并去掉输入中对它的引用
+    - 自定义积木的原型和参数积木通过定义积木的输入引用，会被保留
+    """
+    reachable = set()
+    stack = [flag for flag, block in blocks.items() if is_root(block)]
+    while stack:
+        flag = stack.pop()
+        if flag in reachable or flag not in blocks:
+            continue
+        reachable.add(flag)
+        block = blocks[flag]
+        if block.next is not None:
+            stack.append(block.next)
+        for name, value in block.inputs.items():
+            if len(value) > 2 and isinstance(value[2], str):
+                block.inputs[name] = value = value[:2]  # 被盖住的影子积木
+            if isinstance(value[1], str):
+                stack.append(value[1])
+    removed = Counter()
+    for flag in [flag for flag in blocks if flag not in reachable]:
+        removed[blocks.pop(flag).opcode] += 1
+    return removed
+
+
+def _is_literal(value: list) -> bool:
+    """判断输入是否是直接写在输入框里的常量"""
+    return value[0] == 1 and isinstance(value[1], list) and value[1][0] in LITERAL_TYPES
+
+
+def fold_constants(blocks: dict, evaluate) -> int:
+    """
+    在加载时计算输入全是常量的运算积木，把结果直接写进输入框
+
+    参数:
+    blocks: 角色的积木字典（积木ID -> Block），原地修改
+    evaluate: 执行一个积木并返回结果的函数，参数是积木ID；
+              用解释器自己的实现计算，保证结果和运行时完全一样
+
+    返回:
+    int: 被折叠（替换成常量后删除）的积木数量
+
+    说明:
+    - 只折叠FOLDABLE_OPCODES中的积木，从里到外逐层折叠，
+      比如(60) * ((1) + (2))会整个变成一个常量
+    - 布尔输入（类型2，如如果积木的条件）必须放积木，不能换成常量，不折叠
+    - 计算出错（如除以0）的积木保留原样，运行时照常报错
+    """
+    results = {}  # 积木ID -> 折叠结果，不能折叠时为None
+
+    def fold(flag):
+        if flag in results:
+            return results[flag]
+        results[flag] = None
+        block = blocks.get(flag)
+        if block is None or block.opcode not in FOLDABLE_OPCODES:
+            return None
+        replace_inputs(block)
+        if not all(_is_literal(value) for value in block.inputs.values()):
+            return None
+        try:
+            result = evaluate(flag)
+        except Exception:
+            return None
+        if isinstance(result, str):
+            results[flag] = result
+        return results[flag]
+
+    def replace_inputs(block):
+        for name, value in block.inputs.items():
+            if value[0] == 2 or not isinstance(value[1], str):
+                continue
+            result = fold(value[1])
+            if result is not None:
+                block.inputs[name] = [1, [10, result]]
+                del blocks[value[1]]
+
+    for flag in list(blocks):
+        if flag in blocks:
+            replace_inputs(blocks[flag])
+    return len(results) - list(results.values()).count(None)
+
+
+def procedure_index(blocks: dict) -> dict:
+    """
+    建立自定义积木的索引
+
+    参数:
+    blocks: 角色的积木字典（积木ID -> Block）
+
+    返回:
+    dict: {proccode: (定义积木的ID, {大写的参数ID: 参数名}, 是否不刷新屏幕执行)}
+
+    说明:
+    - 调用自定义积木时按proccode直接查到定义，不需要每次扫描所有积木
+    - S_eval把输入名统一转成大写，所以参数ID也用大写作键
+    """
+    index = {}
+    for flag, block in blocks.items():
+        if block.opcode != "procedures_definition":
+            continue
+        prototype = blocks.get(block.inputs.get("custom_block", [None, None])[1])
+        if prototype is None or prototype.mutation is None:
+            continue
+        mutation = prototype.mutation
+        ids = json.loads(mutation.get("argumentids", "[]"))
+        names = json.loads(mutation.get("argumentnames", "[]"))
+        warp = mutation.get("warp") in (True, "true")
+        index[mutation["proccode"]] = (flag, {i.upper(): name for i, name in zip(ids, names)}, warp)
+    return index
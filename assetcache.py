@@ -0,0 +1,119 @@
+import mmap
+import os
+import struct
+import threading
+import logging
+import pygame
+
+
+class AssetCache:
+    """
+    解码后造型的磁盘缓存
+
+    .sb3中的资源按内容的md5命名，同一个md5的图像解码结果永远相同，
+    所以可以把解码（SVG还包括放大）后的RGBA像素按(md5, 缩放倍数)存到本地目录，
+    下次启动时直接内存映射读取，不需要再做PNG/SVG解码。
+
+    文件格式:
+    - 文件名: <md5>_<缩放倍数>.rgba
+    - 文件头: 魔数b"SRC1"、宽、高（struct格式"<4sII"）
+    - 之后是宽*高*4字节的RGBA像素
+
+    特性:
+    - 写入先写临时文件再改名，多个实例同时使用同一个目录也不会读到半个文件
+    - 目录总大小超过上限时按最近使用时间（命中时会更新文件修改时间）淘汰最旧的文件
+    """
+
+    MAGIC = b"SRC1"
+    HEADER = struct.Struct("<4sII")
+    SUFFIX = ".rgba"
+
+    def __init__(self, directory: str, limit: int) -> None:
+        """
+        初始化缓存
+
+        参数:
+        directory: 缓存目录，不存在时自动创建
+        limit: 缓存目录的大小上限（字节）
+        """
+        self.directory = directory
+        self.limit = limit
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self) -> list:
+        """列出缓存目录中的所有缓存文件"""
+        return [entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(self.SUFFIX)]
+
+    def _path(self, md5: str, scale: float) -> str:
+        """缓存文件路径"""
+        return os.path.join(self.directory, f"{md5}_{scale:g}{self.SUFFIX}")
+
+    def load(self, md5: str, scale: float) -> "pygame.Surface | None":
+        """
+        读取缓存的图像
+
+        参数:
+        md5: 资源的md5（assetId）
+        scale: 解码时的缩放倍数
+
+        返回:
+        pygame.Surface: 缓存命中时返回图像，否则返回None
+        """
+        path = self._path(md5, scale)
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, width, height = self.HEADER.unpack_from(data)
+                if magic != self.MAGIC or len(data) != self.HEADER.size + width * height * 4:
+                    return None
+                pixels = memoryview(data)[self.HEADER.size:]
+                try:
+                    # convert_alpha会复制像素，之后就可以关闭映射
+                    image = pygame.image.frombuffer(pixels, (width, height), "RGBA").convert_alpha()
+                finally:
+                    pixels.release()
+            os.utime(path)  # 记录最近使用时间
+            return image
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def store(self, md5: str, scale: float, image: pygame.Surface) -> None:
+        """
+        把解码好的图像写入缓存
+
+        参数:
+        md5: 资源的md5（assetId）
+        scale: 解码时的缩放倍数
+        image: 解码好的图像
+        """
+        path = self._path(md5, scale)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        width, height = image.get_size()
+        try:
+            with open(temp, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, width, height))
+                f.write(pygame.image.tobytes(image, "RGBA"))
+            os.replace(temp, path)
+        except OSError as e:
+            logging.warning(f"写入资源缓存失败: {e}")
+            return
+        with self.lock:
+            self.size += self.HEADER.size + width * height * 4
+            if self.size > self.limit:
+                self._evict()
+
+    def _evict(self) -> None:
+        """删除最久没有使用的缓存文件，直到目录大小不超过上限"""
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.limit:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.size -= size
+            except OSError:
+                pass
@@ -0,0 +1,75 @@
+import hashlib
+import io
+import zipfile
+import pygame
+
+
+class AssetStore:
+    """
+    资源仓库 - 直接从.sb3压缩包中读取资源，不解压到磁盘
+
+    .sb3文件就是一个ZIP压缩包，里面有project.json和按md5命名的造型、声音文件。
+    以前启动时会把所有文件解压到当前目录，退出时再逐个删除；
+    现在在打开时把所有成员读进内存，之后都从内存中的字节解码。
+
+    特性:
+    - 不写文件系统，同一目录可以同时运行多个实例
+    - 不会因为异常退出或DEBUG日志级别而残留文件
+    - 读取完成后立即关闭压缩包，可以在多个线程中同时读取
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        打开项目文件并把所有成员读入内存
+
+        参数:
+        path: .sb3文件路径
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        self.digest = hashlib.sha256(data).hexdigest()  # 整个.sb3的哈希，用作编译缓存的键
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self._members = {name: archive.read(name) for name in archive.namelist()}
+
+    def __contains__(self, name: str) -> bool:
+        """判断压缩包中是否有指定的成员"""
+        return name in self._members
+
+    def names(self) -> list:
+        """返回压缩包中所有成员的名字"""
+        return list(self._members)
+
+    def read(self, name: str) -> bytes:
+        """
+        读取成员的原始字节
+
+        参数:
+        name: 成员名（如"project.json"或"<md5>.png"）
+
+        返回:
+        bytes: 成员内容，找不到时抛出KeyError
+        """
+        return self._members[name]
+
+    def pop(self, name: str) -> bytes:
+        """
+        读取成员的原始字节，并从内存中释放它
+
+        说明:
+        - 用于只读一次的成员（如project.json），读完不再占用内存
+        """
+        return self._members.pop(name)
+
+    def load_image(self, name: str) -> pygame.Surface:
+        """
+        从内存中解码图像
+
+        参数:
+        name: 成员名，扩展名用于告诉pygame图像格式（svg/png/jpg）
+
+        返回:
+        pygame.Surface: 解码后的图像
+        """
+        return pygame.image.load(io.BytesIO(self.read(name)), name)
+
@@ -0,0 +1,78 @@
+import sys
+
+
+class Block:
+    """
+    积木 - project.json中一个积木的紧凑表示
+
+    project.json中每个积木都是一个字典，每个字段都带字符串键，
+    积木ID和opcode在整个文件里重复出现很多次。
+    加载时把它们转换成这个类：
+    - 使用__slots__，没有每个对象一份的__dict__
+    - opcode、积木ID、输入和字段名都用sys.intern驻留，相同的字符串只存一份，
+      比较和作为字典键查找时也更快
+    - 只保留解释器用到的字段，x、y、topLevel、comment等编辑器字段直接丢弃
+
+    属性:
+    - opcode: 积木类型，对应Sprite上的同名方法
+    - next: 下一个积木的ID，没有时为None
+    - parent: 父积木的ID，没有时为None
+    - inputs: 输入字典，格式与project.json相同
+    - fields: 字段字典，格式与project.json相同
+    - shadow: 是否为影子积木（输入框里的默认值、菜单）
+    - mutation: 自定义积木的附加信息，没有时为None
+    """
+
+    __slots__ = ("opcode", "next", "parent", "inputs", "fields", "shadow", "mutation")
+
+    def __init__(self, opcode: str, next: str = None, parent: str = None, inputs: dict = None,
+                 fields: dict = None, shadow: bool = False, mutation: dict = None) -> None:
+        """初始化积木，参数含义见类说明"""
+        self.opcode = opcode
+        self.next = next
+        self.parent = parent
+        self.inputs = inputs if inputs is not None else {}
+        self.fields = fields if fields is not None else {}
+        self.shadow = shadow
+        self.mutation = mutation
+
+    def __repr__(self) -> str:
+        """返回积木的字符串表示（用于调试）"""
+        return f"Block({self.opcode})"
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Block":
+        """
+        从project.json中的积木字典创建积木
+
+        参数:
+        data: 积木字典
+
+        返回:
+        Block: 字符串都已驻留的积木
+        """
+        return cls(
+            sys.intern(data["opcode"]),
+            _intern(data.get("next")),
+            _intern(data.get("parent")),
+            {sys.intern(key): _intern_input(value) for key, value in data.get("inputs", {}).items()},
+            {sys.intern(key): value for key, value in data.get("fields", {}).items()},
+            data.get("shadow", False),
+            data.get("mutation"),
+        )
+
+
+def _intern(value):
+    """驻留字符串，其他值原样返回"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _intern_input(value: list) -> list:
+    """
+    驻留输入中引用的积木ID
+
+    说明:
+    - 输入的格式是[类型, 积木ID或常量, (可选)被遮住的影子]，
+      积木ID是字符串，常量是列表，只驻留积木ID
+    """
+    return [_intern(item) for item in value]
@@ -0,0 +1,103 @@
+"""
+造型的紧凑包围盒和凸包
+
+造型图片往往带有大量透明边距，用图片矩形判断碰到边缘既不准也慢。
+这里在加载时为每个造型算出不透明像素的包围盒和凸包（Scratch坐标系，
+以旋转中心为原点，y向上），运行时只需根据位置、方向和大小做解析变换。
+"""
+
+import math
+from typing import List, Tuple
+import pygame
+
+Point = Tuple[float, float]
+
+
+def convex_hull(points: List[Point]) -> List[Point]:
+    """
+    计算点集的凸包（Andrew单调链算法）
+
+    参数:
+    points: 点的列表
+
+    返回:
+    list: 凸包顶点，逆时针排列
+    """
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper = []
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+
+def costume_geometry(image: pygame.Surface, centre_x: float, centre_y: float,
+                     resolution: float) -> Tuple[tuple, List[Point]]:
+    """
+    计算造型不透明部分的包围盒和凸包
+
+    参数:
+    image: 造型图像
+    centre_x, centre_y: 旋转中心（图像像素）
+    resolution: 每个Scratch单位对应的图像像素数
+
+    返回:
+    (bounds, hull):
+    - bounds: (left, right, bottom, top)，Scratch单位，以旋转中心为原点
+    - hull: 凸包顶点列表，坐标同上
+
+    说明:
+    - 每一行只取最左、最右的不透明像素的四个角，凸包与逐像素计算相同
+    - 完全透明的造型退化为旋转中心一个点
+    """
+    opaque = pygame.surfarray.array_alpha(image) > 0  # 形状为(宽, 高)
+    rows = opaque.any(axis=0).nonzero()[0]
+    points = []
+    for y in rows:
+        columns = opaque[:, y].nonzero()[0]
+        left, right = columns[0], columns[-1] + 1
+        for px in (left, right):
+            for py in (y, y + 1):
+                points.append(((px - centre_x) / resolution, (centre_y - py) / resolution))
+    if not points:
+        points = [(0.0, 0.0)]
+
+    hull = [(float(x), float(y)) for x, y in convex_hull(points)]
+    xs = [p[0] for p in hull]
+    ys = [p[1] for p in hull]
+    return (min(xs), max(xs), min(ys), max(ys)), hull
+
+
+def transform_bounds(hull: List[Point], x: float, y: float,
+                     direction: float, size: float) -> Tuple[float, float, float, float]:
+    """
+    根据角色的位置、方向和大小，求凸包在舞台上的包围盒
+
+    参数:
+    hull: costume_geometry得到的凸包
+    x, y: 角色位置（Scratch坐标系）
+    direction: 角色方向（90度为不旋转）
+    size: 角色大小（百分比）
+
+    返回:
+    (left, right, bottom, top): Scratch坐标系中的包围盒
+    """
+    scale = size / 100
+    angle = math.radians(direction - 90)  # 顺时针旋转
+    c = math.cos(angle) * scale
+    s = math.sin(angle) * scale
+    xs = [x + px * c + py * s for px, py in hull]
+    ys = [y - px * s + py * c for px, py in hull]
+    return min(xs), max(xs), min(ys), max(ys)
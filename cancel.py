@@ -0,0 +1,69 @@
+import threading
+
+
+class CancelToken:
+    """
+    脚本的取消令牌
+
+    每个脚本线程启动时分配一个令牌。停止积木、删除克隆体和退出程序时取消令牌，
+    脚本在循环的每一轮和等待时检查令牌，被取消后自行结束，不需要强行终止线程。
+
+    特性:
+    - 基于threading.Event，任何线程都可以检查cancelled
+    - 等待中的脚本（等待补间结束、等待下一帧）用on_cancel注册回调，取消时立即被唤醒
+    - 取消是单向的，取消后的令牌不能恢复
+    """
+
+    __slots__ = ("_event", "_callbacks", "_lock")
+
+    def __init__(self) -> None:
+        """初始化令牌（未取消）"""
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """取消令牌，并调用所有注册的回调"""
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback) -> None:
+        """
+        注册取消时调用的回调
+
+        参数:
+        callback: 无参数的函数；令牌已经取消时立即调用
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback) -> None:
+        """取消注册回调，回调不存在时忽略"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self) -> bool:
+        """令牌是否已被取消"""
+        return self._event.is_set()
+
+
+_local = threading.local()
+_never = CancelToken()  # 不属于任何脚本的线程（主线程、加载时）使用，永远不会被取消
+
+
+def bind_token(token: CancelToken) -> None:
+    """把令牌绑定到当前线程，由脚本线程启动时调用"""
+    _local.token = token
+
+
+def current_token() -> CancelToken:
+    """返回当前线程正在执行的脚本的令牌"""
+    return getattr(_local, "token", _never)
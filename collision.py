@@ -1,5 +1,56 @@
+import weakref
 import pygame
 
+# Scratch比较颜色时保留的位：红、绿取高5位，蓝取高4位
+COLOR_TOLERANCE = (0b11111000, 0b11111000, 0b11110000)
+# "颜色碰到颜色"中角色自身的颜色：每个通道取高6位
+MASK_COLOR_TOLERANCE = (0b11111100, 0b11111100, 0b11111100)
+
+# 每张图像的碰撞遮罩缓存，图像被回收后遮罩自动释放
+_mask_cache = weakref.WeakKeyDictionary()
+
+
+def get_mask(image):
+    """
+    获取图像的碰撞遮罩（带缓存）
+    
+    参数:
+    image: pygame.Surface 对象
+    
+    返回:
+    pygame.mask.Mask: 图像的遮罩，同一张图像只计算一次
+    """
+    mask = _mask_cache.get(image)
+    if mask is None:
+        mask = pygame.mask.from_surface(image)
+        _mask_cache[image] = mask
+    return mask
+
+
+def hit_test(layers, point):
+    """
+    找到某个点上最前面的图层
+
+    参数:
+    layers: (对象, rect, image)的可迭代对象，按从前往后的顺序
+    point: Pygame坐标系中的点(x, y)
+
+    返回:
+    第一个在这个点上有不透明像素的图层的对象，没有时返回None
+
+    说明:
+    - 先用矩形筛选，只有矩形包含这个点时才取（缓存的）遮罩检查像素
+    - 找到第一个就停止，后面的图层不再检查；layers可以是生成器
+    """
+    x, y = point
+    for owner, rect, image in layers:
+        if not rect.collidepoint(x, y):
+            continue
+        if get_mask(image).get_at((x - rect.x, y - rect.y)):
+            return owner
+    return None
+
+
 def check_collision(rect1, image1, rect2, image2):
     """
     检测两个不规则图像之间的碰撞
@@ -16,8 +67,8 @@ def check_collision(rect1, image1, rect2, image2):
         return False
     
     # 第二步：创建图像的遮罩（mask）
-    mask1 = pygame.mask.from_surface(image1)
-    mask2 = pygame.mask.from_surface(image2)
+    mask1 = get_mask(image1)
+    mask2 = get_mask(image2)
     
     # 第三步：计算两个矩形之间的偏移量
     offset_x = rect2.x - rect1.x
@@ -30,6 +81,89 @@ def check_collision(rect1, image1, rect2, image2):
     return overlap is not None
 
 
+def parse_color(value):
+    """
+    把Scratch的颜色参数转换为(r, g, b)元组
+    
+    参数:
+    value: "#rrggbb"或"#rgb"形式的字符串，或者表示0xRRGGBB的数字
+    
+    返回:
+    (r, g, b): 三个0-255的整数
+    """
+    value = str(value).strip()
+    try:
+        if value.startswith("#"):
+            digits = value[1:7]
+            if len(digits) == 3:
+                digits = "".join(c * 2 for c in digits)  # "#f00"和"#ff0000"相同
+            number = int(digits, 16)
+        else:
+            number = int(float(value))
+    except ValueError:
+        number = 0
+    return (number >> 16) & 0xFF, (number >> 8) & 0xFF, number & 0xFF
+
+
+def _color_matches(surface, color, tolerance):
+    """
+    surface的每个像素是否为color，只比较tolerance中为1的位（不比较透明度）
+
+    说明:
+    - 直接在打包后的32位像素上按位与后比较，numpy一次完成
+    """
+    bits = surface.map_rgb((*tolerance, 0))
+    target = surface.map_rgb((*color, 0)) & bits
+    pixels = pygame.surfarray.pixels2d(surface)
+    matched = (pixels & bits) == target
+    del pixels  # 释放对surface的锁定
+    return matched
+
+
+def check_touching_color(rect, image, layers, bounds, color, mask_color=None):
+    """
+    检测角色是否碰到指定颜色
+    
+    参数:
+    rect, image: 角色的位置矩形和图像
+    layers: 角色以外按绘制顺序排列的(image, rect)列表（舞台在最前）
+    bounds: 舞台的矩形，超出舞台的部分不参与比较
+    color: 要检测的颜色(r, g, b)
+    mask_color: 不为None时只比较角色自身为该颜色的像素（"颜色碰到颜色"）
+    
+    返回:
+    bool: 碰到返回True，否则返回False
+    
+    说明:
+    - 只在角色遮罩的包围盒内合成舞台，合成时不包括角色自己
+    - 颜色比较用numpy一次完成，不逐像素循环
+    """
+    boxes = get_mask(image).get_bounding_rects()
+    if not boxes:
+        return False
+    box = boxes[0].unionall(boxes[1:])
+    area = box.move(rect.topleft).clip(bounds)
+    if area.width == 0 or area.height == 0:
+        return False
+    box = area.move(-rect.x, -rect.y)  # 裁剪后的包围盒（角色图像坐标系）
+
+    # 合成角色下方（以及其他角色）在该区域内的画面
+    composite = pygame.Surface(area.size, 0, 32)
+    composite.fill((255, 255, 255))
+    for layer_image, layer_rect in layers:
+        if layer_rect.colliderect(area):
+            composite.blit(layer_image, (layer_rect.x - area.x, layer_rect.y - area.y))
+
+    sprite_part = image.subsurface(box)
+    selected = pygame.surfarray.array_alpha(sprite_part) > 127
+    if mask_color is not None:
+        selected &= _color_matches(sprite_part, mask_color, MASK_COLOR_TOLERANCE)
+
+    # Scratch只比较红、绿的高5位和蓝的高4位
+    matched = _color_matches(composite, color, COLOR_TOLERANCE)
+    return bool((matched & selected).any())
+
+
 # 使用示例
 def example_usage():
     # 初始化 Pygame
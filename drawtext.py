@@ -6,12 +6,17 @@ try:
     font = pygame.font.SysFont("simhei",30)
 except:#不排除其他国家没有宋体        
     font = pygame.font.SysFont(None,16)
-def drawtext(sprite,surface):
-    if sprite.words=="":
+def drawtext(sprite,surface,words=None,rect=None):
+    #words为None时读取角色当前的说话内容，渲染时传入快照中的说话内容
+    #rect为None时用角色上一次画出来的位置，渲染时传入这一帧画出来的位置
+    if words is None:
+        words=sprite.words
+    if words=="":
         return
-    rect=sprite.rect
+    if rect is None:
+        rect=sprite.drawn[1]
     
-    text=sprite.words
+    text=words
     if len(text)>50:
         #每10字符换行难度大，暂时不做处理        
         text=text[:10]+"..."
@@ -23,6 +28,27 @@ def drawtext(sprite,surface):
     pygame.draw.rect(surface, (255, 255, 255), (*rect.topright, *textsurface.get_size()),0,10)
     pygame.draw.rect(surface, (0, 0, 0), (rect.topright[0]-5,rect.topright[1]-5, textsurface.get_size()[0]+10,textsurface.get_size()[1]+10),2,10)
     surface.blit(textsurface,rect.topright)
+def drawprogress(surface,finished,total):
+    """
+    绘制加载进度条（加载资源时在窗口中央显示）
+    
+    参数:
+    surface: 要绘制的画板
+    finished: 已经完成的数量
+    total: 总数
+    """
+    surface.fill((255, 255, 255))
+    width, height = surface.get_size()
+    bar = pygame.Rect(0, 0, width // 2, 24)
+    bar.center = (width // 2, height // 2)
+    pygame.draw.rect(surface, (230,240,255), bar, 0, 6)
+    if total:
+        filled = bar.copy()
+        filled.width = bar.width * finished // total
+        pygame.draw.rect(surface, (255, 140, 26), filled, 0, 6)
+    pygame.draw.rect(surface, (0, 0, 0), bar, 2, 6)
+    textsurface = font.render(f"{finished}/{total}", True, (0, 0, 0))
+    surface.blit(textsurface, textsurface.get_rect(midtop=(bar.centerx, bar.bottom + 10)))
 def drawvariable(monitor,text,surface):
     #font =pygame.font.Font("HarmonyOS_Sans_SC_Regular.ttf",24)
     #logging.debug(text)
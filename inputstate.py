@@ -0,0 +1,132 @@
+import logging
+from typing import NamedTuple
+
+import pygame
+
+from keymap import keymap
+from position import Position
+
+
+class InputState(NamedTuple):
+    """
+    一帧的输入快照（不可变）
+
+    属性:
+    - keys: 按住的键（pygame.key.get_pressed()的结果，按键码索引）
+    - mouse_x, mouse_y: 鼠标在Scratch坐标系中的位置
+    - mouse_pos: 鼠标在窗口中的位置（Show坐标系）
+    - buttons: 鼠标左、中、右键是否按下
+    - keys_down: 上个逻辑帧以来按下过的键码
+    - clicks: 上个逻辑帧以来鼠标左键按下的位置（Scratch坐标系）
+    - releases: 上个逻辑帧以来鼠标左键松开的位置（Scratch坐标系）
+    """
+    keys: tuple = ()
+    mouse_x: int = 0
+    mouse_y: int = 0
+    mouse_pos: tuple = (0, 0)
+    buttons: tuple = (False, False, False)
+    keys_down: frozenset = frozenset()
+    clicks: tuple = ()
+    releases: tuple = ()
+
+    @property
+    def mouse_down(self) -> bool:
+        """鼠标左键是否按下"""
+        return self.buttons[0]
+
+    def key_pressed(self, name: str) -> bool:
+        """
+        某个键是否按住
+
+        参数:
+        name: Scratch中的键名（如"space"、"a"），"any"表示任意键
+
+        返回:
+        bool: 按住时为True，不认识的键名为False
+        """
+        if not self.keys:
+            return False
+        if name == "any":
+            return any(self.keys)
+        code = keymap.get(name)
+        return code is not None and bool(self.keys[code])
+
+    def key_hit(self, name: str) -> bool:
+        """
+        上个逻辑帧以来某个键是否被按下过（按下又松开的短按也算）
+
+        参数:
+        name: Scratch中的键名，"any"表示任意键
+        """
+        if name == "any":
+            return bool(self.keys_down)
+        return keymap.get(name) in self.keys_down
+
+
+class InputTracker:
+    """
+    输入采集 - 主循环每帧取出所有事件，生成一份输入快照
+
+    以前主循环每帧只poll一个事件，负载高时事件越积越多，输入越来越迟钝；
+    侦测积木在脚本线程里直接调用pygame.mouse，读到的状态也不一致。
+    现在主循环每帧调用一次poll，取出队列里的所有事件，
+    把按键、鼠标位置和按键、鼠标点击等边沿事件做成一份不可变的InputState，
+    脚本线程只读state属性。
+
+    说明:
+    - poll和take_edges都只在主线程调用，state的替换是原子的，读写都不需要加锁
+    - 渲染帧率比逻辑帧率高，边沿事件一直累积到下一个逻辑帧调用take_edges，
+      两个逻辑帧之间的短按和点击不会丢失
+    """
+
+    def __init__(self) -> None:
+        """初始化，还没有输入时state为空的快照"""
+        self.state = InputState()
+        self._keys_down = set()
+        self._clicks = []
+        self._releases = []
+
+    def poll(self) -> bool:
+        """
+        取出所有事件并更新输入快照，由主循环每帧调用一次
+
+        返回:
+        bool: 收到退出事件时为True
+        """
+        quit_requested = False
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                quit_requested = True
+            elif event.type == pygame.KEYDOWN:
+                logging.debug(f"按下{event.key}")
+                self._keys_down.add(event.key)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                self._clicks.append(Position(*event.pos, "show").scratch())
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                self._releases.append(Position(*event.pos, "show").scratch())
+        self._publish()
+        return quit_requested
+
+    def take_edges(self) -> InputState:
+        """
+        取出当前快照，并清空累积的边沿事件，由逻辑帧调用
+
+        返回:
+        InputState: 包含上个逻辑帧以来所有边沿事件的快照
+        """
+        state = self.state
+        self._keys_down = set()
+        self._clicks = []
+        self._releases = []
+        self.state = state._replace(keys_down=frozenset(), clicks=(), releases=())
+        return state
+
+    def _publish(self) -> None:
+        """用当前的按键、鼠标状态和累积的边沿事件生成新的快照"""
+        mouse_pos = pygame.mouse.get_pos()
+        mouse_x, mouse_y = Position(*mouse_pos, "show").scratch()
+        self.state = InputState(
+            pygame.key.get_pressed(), mouse_x, mouse_y, mouse_pos,
+            tuple(pygame.mouse.get_pressed()[:3]),
+            frozenset(self._keys_down), tuple(self._clicks), tuple(self._releases),
+        )
@@ -0,0 +1,106 @@
+import logging
+
+
+class LoadShedder:
+    """
+    过载策略 - 机器跟不上时先降低画面质量，保证逻辑按实时速度运行
+
+    主循环每渲染一帧报告一次这一帧实际花的时间（不含clock.tick的等待），
+    这里用指数移动平均算出占帧预算（1/FPS）的比例，超过上限就升一级，
+    低于下限就降一级。每一级在上一级的基础上多放弃一样东西：
+
+    等级:
+    - 0: 正常
+    - 1: 显示框降低刷新率（每MONITOR_INTERVALS帧重画一次，其余帧复用上次的结果）
+    - 2: 旋转缓存按ROTATION_STEPS度取整角度（见rotate.RotationCache），旋转中的角色也能命中缓存
+    - 3: 隔帧渲染，省下的时间留给脚本线程
+
+    说明:
+    - 改变等级后至少保持HOLD帧，避免在两级之间来回跳
+    - counters记录放弃了多少工作，可以用stats()取出
+    """
+
+    RAISE = 0.9  # 负载超过帧预算的这个比例时升级
+    LOWER = 0.5  # 负载低于帧预算的这个比例时降级
+    HOLD = 30
+    MONITOR_INTERVALS = (1, 4, 4, 8)
+    ROTATION_STEPS = (0, 0, 5, 10)
+    RENDER_INTERVALS = (1, 1, 1, 2)
+
+    def __init__(self, budget: float) -> None:
+        """
+        初始化过载策略
+
+        参数:
+        budget: 每帧的时间预算（秒），一般是1/FPS
+        """
+        self.budget = budget
+        self.load = 0.0  # 最近几帧平均占用预算的比例
+        self.level = 0
+        self.frame = 0
+        self._hold = 0
+        self.counters = {
+            "frames_rendered": 0,
+            "frames_skipped": 0,
+            "monitor_redraws_skipped": 0,
+            "rotations_quantized": 0,
+            "ticks_dropped": 0,
+        }
+
+    def record(self, work: float) -> None:
+        """
+        报告一帧实际花的时间，按负载调整等级
+
+        参数:
+        work: 这一帧处理事件、推进逻辑和渲染花的秒数
+        """
+        self.load = self.load * 0.9 + work / self.budget * 0.1
+        if self._hold:
+            self._hold -= 1
+            return
+        if self.load > self.RAISE and self.level < len(self.RENDER_INTERVALS) - 1:
+            self._set_level(self.level + 1)
+        elif self.load < self.LOWER and self.level > 0:
+            self._set_level(self.level - 1)
+
+    def _set_level(self, level: int) -> None:
+        """切换等级并记录日志"""
+        logging.info(f"负载{self.load:.0%}，过载等级{self.level} -> {level}")
+        self.level = level
+        self._hold = self.HOLD
+
+    def should_render(self) -> bool:
+        """这一帧是否渲染，每个主循环调用一次"""
+        self.frame += 1
+        if self.frame % self.RENDER_INTERVALS[self.level]:
+            self.counters["frames_skipped"] += 1
+            return False
+        self.counters["frames_rendered"] += 1
+        return True
+
+    @property
+    def monitor_interval(self) -> int:
+        """显示框每几帧重画一次"""
+        return self.MONITOR_INTERVALS[self.level]
+
+    def should_redraw_monitors(self) -> bool:
+        """这一帧是否重画显示框"""
+        if self.frame % self.monitor_interval:
+            self.counters["monitor_redraws_skipped"] += 1
+            return False
+        return True
+
+    def rotation_step(self) -> float:
+        """旋转缓存的角度取整步长，每次旋转调用一次"""
+        step = self.ROTATION_STEPS[self.level]
+        if step:
+            self.counters["rotations_quantized"] += 1
+        return step
+
+    def drop_ticks(self, count: int) -> None:
+        """记录因为落后太多而丢掉的逻辑帧"""
+        self.counters["ticks_dropped"] += count
+
+    def stats(self) -> dict:
+        """返回当前等级、负载和所有计数"""
+        return dict(self.counters, level=self.level, load=round(self.load, 2))
@@ -0,0 +1,86 @@
+import os
+import pickle
+import logging
+
+
+class ProjectCache:
+    """
+    编译后项目的缓存
+
+    每次启动都要json.loads解析project.json、用setattr逐个构建Sprite对象、
+    建立各种索引，大项目这一步比短时间的运行还慢。
+    这里把整理好的项目（角色、积木、索引、显示框）用pickle存下来，
+    以.sb3的哈希和运行器版本作为键，下次启动直接读取。
+
+    说明:
+    - .sb3内容或者运行器代码变了，键就变了，旧的缓存自然不会被读到
+    - 同一个项目的旧版本缓存在写入新缓存时删除
+    - 写入先写临时文件再改名，多个实例同时运行也不会读到半个文件
+    - 缓存损坏或者无法读取时当作没有缓存处理
+    """
+
+    SUFFIX = ".pickle"
+
+    def __init__(self, directory: str) -> None:
+        """
+        初始化缓存
+
+        参数:
+        directory: 缓存目录，不存在时自动创建
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str, version: str) -> str:
+        """缓存文件路径"""
+        return os.path.join(self.directory, f"{digest}-{version}{self.SUFFIX}")
+
+    def load(self, digest: str, version: str):
+        """
+        读取编译好的项目
+
+        参数:
+        digest: .sb3文件的哈希
+        version: 运行器版本
+
+        返回:
+        缓存的项目，没有缓存或缓存损坏时返回None
+        """
+        try:
+            with open(self._path(digest, version), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"读取项目缓存失败: {e}")
+            return None
+
+    def store(self, digest: str, version: str, project) -> None:
+        """
+        写入编译好的项目
+
+        参数:
+        digest: .sb3文件的哈希
+        version: 运行器版本
+        project: 要缓存的项目（必须能被pickle）
+        """
+        path = self._path(digest, version)
+        temp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "wb") as f:
+                pickle.dump(project, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, path)
+        except Exception as e:
+            logging.warning(f"写入项目缓存失败: {e}")
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            return
+        # 删除同一个项目其他版本的缓存
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(digest + "-") and entry.path != path and entry.name.endswith(self.SUFFIX):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
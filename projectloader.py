@@ -0,0 +1,101 @@
+"""
+流式读取project.json
+
+json.loads会一次性构建整个项目的字典树，加上原始文本和之后创建的角色对象，
+峰值内存是项目大小的好几倍。这里逐个解析targets中的角色，
+调用方处理完一个角色、释放它的原始字典之后才解析下一个。
+"""
+
+import json
+import re
+import sys
+from typing import Iterator, Tuple
+from block import Block
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def _skip(text: str, index: int) -> int:
+    """跳过空白字符"""
+    return _WHITESPACE.match(text, index).end()
+
+
+def _expect(text: str, index: int, char: str) -> int:
+    """跳过空白后要求出现指定字符，返回该字符之后的位置"""
+    index = _skip(text, index)
+    if text[index:index + 1] != char:
+        raise ValueError(f"project.json格式错误：位置{index}应为{char!r}")
+    return index + 1
+
+
+def iter_project(text: str) -> Iterator[Tuple[str, object]]:
+    """
+    逐个产出project.json的顶层内容
+
+    参数:
+    text: project.json的文本
+
+    返回:
+    迭代器，元素为(键, 值)：
+    - targets中的每个角色单独产出为("target", 角色字典)
+    - 其他顶层键（monitors、extensions、meta）整体产出
+
+    说明:
+    - 同一时间只有一个角色的字典树在内存中
+    """
+    index = _expect(text, 0, "{")
+    index = _skip(text, index)
+    if text[index:index + 1] == "}":
+        return
+    while True:
+        key, index = _decoder.raw_decode(text, _skip(text, index))
+        index = _expect(text, index, ":")
+        if key == "targets":
+            index = _expect(text, index, "[")
+            index = _skip(text, index)
+            if text[index:index + 1] == "]":
+                index += 1
+            else:
+                while True:
+                    target, index = _decoder.raw_decode(text, _skip(text, index))
+                    yield "target", target
+                    del target
+                    index = _skip(text, index)
+                    if text[index:index + 1] == "]":
+                        index += 1
+                        break
+                    index = _expect(text, index, ",")
+        else:
+            value, index = _decoder.raw_decode(text, _skip(text, index))
+            yield key, value
+            del value
+        index = _skip(text, index)
+        if text[index:index + 1] == "}":
+            return
+        index = _expect(text, index, ",")
+
+
+def compact_target(target: dict) -> dict:
+    """
+    把角色转换成运行时使用的紧凑形式
+
+    参数:
+    target: project.json中的一个角色字典（原地修改）
+
+    返回:
+    dict: 同一个字典
+
+    说明:
+    - 删除注释
+    - 积木字典转换为Block对象（见block.Block），坐标等编辑器字段在转换时丢弃，
+      原始的积木字典随即释放
+    - 删除散落在代码区、没有连到任何脚本的变量/列表积木（它们是列表形式）
+    """
+    target.pop("comments", None)
+    target["blocks"] = {
+        sys.intern(flag): Block.from_json(block)
+        for flag, block in target["blocks"].items()
+        if isinstance(block, dict)
+    }
+    return target
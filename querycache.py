@@ -0,0 +1,44 @@
+class QueryCache:
+    """
+    每帧的侦测结果缓存
+
+    同一帧里很多脚本会问同一个问题（比如200个克隆体都问"碰到Player?"），
+    这里把结果按(查询, 角色, 目标, 帧号, 双方状态)缓存起来，
+    同一帧内重复查询只需要一次字典查找。
+
+    说明:
+    - 帧号由主循环通过next_frame推进，换帧时整个字典被替换掉
+    - 键里包含双方的状态（位置、方向、大小、造型），
+      任何一方移动、旋转、缩放或换造型后键就变了，旧结果自然失效
+    - 字典整体替换而不是clear()，其他线程拿到的旧字典不会被清空到一半
+    """
+
+    def __init__(self) -> None:
+        """初始化缓存，帧号从0开始"""
+        self.frame = 0
+        self._results = {}
+
+    def next_frame(self) -> None:
+        """进入下一帧，丢弃上一帧的所有结果"""
+        self.frame += 1
+        self._results = {}
+
+    def get(self, key: tuple, compute):
+        """
+        获取缓存的结果，没有时调用compute计算并缓存
+
+        参数:
+        key: 查询的键，调用方不用包含帧号，这里会自动加上
+        compute: 无参数的函数，缓存未命中时调用
+
+        返回:
+        查询结果
+        """
+        results = self._results
+        key = (self.frame,) + key
+        try:
+            return results[key]
+        except KeyError:
+            value = compute()
+            results[key] = value
+            return value
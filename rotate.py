@@ -1,5 +1,5 @@
 import pygame
-import logging
+from collections import OrderedDict
 def blitRotate(surf, image, pos, originPos, angle,bilt=True):
     """
     按中心旋转并绘制
@@ -10,10 +10,21 @@ def blitRotate(surf, image, pos, originPos, angle,bilt=True):
     angle 旋转角度
 
     
+    """
+    # get a rotated image
+    rotated_image = pygame.transform.rotate(image, angle)
+    return blitRotated(surf, rotated_image, image.get_size(), pos, originPos, angle, bilt)
+
+def blitRotated(surf, rotated_image, size, pos, originPos, angle, bilt=True):
+    """
+    绘制已经旋转好的图片（见RotationCache）
+    rotated_image 旋转后的图片
+    size 旋转前图片的大小
+    其他参数同blitRotate，angle必须是旋转时用的角度
     """
 
     # offset from pivot to center
-    image_rect = image.get_rect(topleft = (pos[0] - originPos[0], pos[1]-originPos[1]))
+    image_rect = pygame.Rect((pos[0] - originPos[0], pos[1]-originPos[1]), size)
     offset_center_to_pivot = pygame.math.Vector2(pos) - image_rect.center
     
     # roatated offset from pivot to center
@@ -22,15 +33,70 @@ def blitRotate(surf, image, pos, originPos, angle,bilt=True):
     # roatetd image center
     rotated_image_center = (pos[0] - rotated_offset.x, pos[1] - rotated_offset.y)
 
-    # get a rotated image
-    rotated_image = pygame.transform.rotate(image, angle)
     rotated_image_rect = rotated_image.get_rect(center = rotated_image_center)
 
     # rotate and blit the image
     #logging.debug(rotated_image_rect)
     if bilt:
         surf.blit(rotated_image, rotated_image_rect)
-    return rotated_image, rotated_image_rect    
+    return rotated_image, rotated_image_rect
   
     # draw rectangle around the image 我不用这个
-    #pygame.draw.rect(surf, (255, 0, 0), (*rotated_image_rect.topleft, *rotated_image.get_size()),2)
\ No newline at end of file
+    #pygame.draw.rect(surf, (255, 0, 0), (*rotated_image_rect.topleft, *rotated_image.get_size()),2)
+
+class RotationCache:
+    """
+    旋转结果缓存
+
+    大多数角色不是每帧都在转，以前每帧都要重新缩放、旋转一次造型。
+    这里按(造型图像, 大小, 角度)缓存缩放加旋转后的图像，最近最少使用的先淘汰。
+
+    说明:
+    - step为0时按精确角度缓存，画质不变，静止或只平移的角色每帧都能命中
+    - step大于0时角度按step度取整，旋转中的角色也能命中，代价是转动不够平滑；
+      负载高时由LoadShedder调大
+    - 同一个旋转结果是同一个Surface对象，碰撞遮罩缓存（collision.get_mask）也能命中
+    """
+
+    def __init__(self, limit: int = 256) -> None:
+        """
+        初始化缓存
+
+        参数:
+        limit: 最多缓存的旋转结果数量
+        """
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+
+    def get(self, image: pygame.Surface, size: float, angle: float, step: float = 0) -> tuple:
+        """
+        取出缩放并旋转后的图像
+
+        参数:
+        image: 造型图像
+        size: 大小（百分比）
+        angle: 旋转角度（逆时针，度）
+        step: 角度取整的步长，0表示不取整
+
+        返回:
+        (旋转后的图像, 缩放后旋转前的大小, 实际使用的角度)，后两项传给blitRotated
+        """
+        if step:
+            angle = round(angle / step) * step
+        angle %= 360
+        key = (image, size, angle)
+        cached = self._images.get(key)
+        if cached is not None:
+            self._images.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        if size != 100:
+            image = pygame.transform.rotozoom(image, 0, size/100)
+        cached = (pygame.transform.rotate(image, angle), image.get_size(), angle)
+        self._images[key] = cached
+        if len(self._images) > self.limit:
+            self._images.popitem(last=False)
+        return cached
@@ -19,7 +19,8 @@ ScratchRunner是一个用Python编写的Scratch项目(.sb3文件)运行器，它
 架构概述：
 -------------------------------
 1. 初始化阶段：
-   - 加载并解压SB3项目文件（ZIP格式）
+   - 把SB3项目文件（ZIP格式）读入内存，不解压到磁盘
+   - 以SB3的哈希查找编译缓存，命中时直接读取整理好的项目
    - 解析project.json描述文件
    - 创建Sprite对象和Stage对象
    - 初始化变量、列表和监视器
@@ -45,6 +46,7 @@ ScratchRunner是一个用Python编写的Scratch项目(.sb3文件)运行器，它
 - Position: 坐标系转换工具类
 - Sprite: 角色/舞台的基类，包含所有积木方法
 - runcode: 积木执行入口函数
+- runscript: 显式栈解释器，脚本线程的入口
 - Monitor: 变量和列表监视器显示
 
 坐标系系统：
@@ -59,9 +61,10 @@ ScratchRunner是一个用Python编写的Scratch项目(.sb3文件)运行器，它
 
 依赖库：
 - pygame (>=2.0.0): 图形渲染、输入处理和事件循环
+- numpy: 颜色侦测的向量化像素比较（pygame.surfarray依赖）
 - threading: 多线程执行支持
 - json: 项目文件解析
-- zipfile: SB3文件解压
+- zipfile: SB3文件读取
 - logging: 运行日志记录
 - math: 数学运算和三角函数
 - random: 随机数生成
@@ -76,7 +79,7 @@ ScratchRunner是一个用Python编写的Scratch项目(.sb3文件)运行器，它
 3. 按ESC键退出程序
 
 注意事项：
-- 程序会解压SB3文件到当前目录，退出时自动清理
+- 资源直接从内存中的SB3文件解码，不会在当前目录留下文件
 - 支持大多数Scratch 3.0功能，但某些高级功能可能不完全支持
 - 性能取决于项目复杂度和硬件配置
 
@@ -88,7 +91,6 @@ ScratchRunner是一个用Python编写的Scratch项目(.sb3文件)运行器，它
 作者：语翔
 项目地址：https://github.com/tiebanluyu/ScratchRunner
 """
-import json
 import pygame
 import threading
 import traceback
@@ -96,16 +98,32 @@ from math import sin, cos, radians
 import math
 import logging
 import random
-import zipfile
 import os
 import time
 import sys
+import glob
+import hashlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Tuple, Literal
-from drawtext import drawtext, drawvariable, drawlist
-from rotate import blitRotate
+from drawtext import drawtext, drawvariable, drawlist, drawprogress
+from rotate import blitRotated, RotationCache
+from loadshed import LoadShedder
 from variable import safe_int, safe_str, safe_bool, safe_float, IsNum
-from collision import check_collision
+from collision import check_collision, check_touching_color, parse_color, hit_test
 from position import Position
+from querycache import QueryCache
+from snapshot import SpriteState, Snapshot, SnapshotBuffer
+from inputstate import InputTracker
+from cancel import CancelToken, bind_token, current_token
+from ticker import TickSignal
+from tweens import TimerHeap
+from bounds import costume_geometry, transform_bounds
+from assets import AssetStore
+from assetcache import AssetCache
+from projectcache import ProjectCache
+from analysis import predict_costumes, costume_indices, prune_unreachable, fold_constants, procedure_index
+from projectloader import iter_project, compact_target
 
 # 配置日志
 logging.basicConfig(
@@ -119,88 +137,143 @@ class ThreadManager:
     这个类负责管理所有由Scratch积木创建的线程，包括：
     - 绿旗点击事件线程
     - 克隆体执行线程
-    - 其他异步执行的脚本线程
+    - 按键事件线程
     
     特性：
     - 线程安全的线程管理（使用锁机制）
-    - 优雅的线程停止和清理
-    - 防止线程泄漏和僵尸线程
+    - 每个脚本有自己的取消令牌（见cancel.CancelToken），
+      停止积木和退出程序通过取消令牌让脚本自行结束
+    - 启动新脚本时顺便清理已经结束的线程，防止线程列表无限增长
     
     线程状态说明：
     - 活动线程：正在执行Scratch积木逻辑的线程
-    - 已完成线程：执行完毕等待清理的线程
-    - 僵尸线程：异常终止需要清理的线程
+    - 已取消线程：令牌已取消，会在下一个检查点（循环的一轮结束、等待）退出
     """
     
     def __init__(self):
         """初始化线程管理器"""
-        self.threads = []  # 存储所有活动线程的列表
+        self.scripts = []  # 所有脚本，元素为(线程, 角色, 取消令牌)
         self.lock = threading.Lock()  # 线程安全锁
     
-    def add_thread(self, thread: threading.Thread) -> None:
+    def start_script(self, sprite, flag: str, name: str) -> threading.Thread:
         """
-        添加一个新线程到管理器
+        在新线程中执行一个脚本
         
         参数:
-        thread: 要添加的线程对象
+        sprite: 角色对象
+        flag: 脚本第一个积木的ID
+        name: 线程名称，应包含角色名和积木标识符以便调试
         
-        说明:
-        - 线程会自动启动（调用start()方法）
-        - 线程会被设置为守护线程（daemon=True）
-        - 线程名称应包含角色名和积木标识符以便调试
+        返回:
+        threading.Thread: 已启动的守护线程
         """
+        token = CancelToken()
+        thread = threading.Thread(name=name, target=self._run, args=(sprite, flag, token), daemon=True)
         with self.lock:
-            self.threads.append(thread)
-    
-    def remove_thread(self, thread: threading.Thread) -> None:
+            self.scripts = [script for script in self.scripts if script[0].is_alive()]
+            self.scripts.append((thread, sprite, token))
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _run(sprite, flag: str, token: CancelToken) -> None:
+        """脚本线程的入口：绑定令牌后执行脚本"""
+        bind_token(token)
+        runscript(sprite, flag)
+
+    def cancel(self, sprite=None, exclude: CancelToken = None) -> None:
         """
-        从管理器中移除指定线程
+        取消脚本
         
         参数:
-        thread: 要移除的线程对象
+        sprite: 只取消这个角色（或克隆体）的脚本，为None时取消所有脚本
+        exclude: 不取消的令牌（停止"该角色的其他脚本"时排除自己）
         
         说明:
-        - 如果线程仍在运行，会先尝试停止
-        - 线程移除后会被垃圾回收
-        - 线程安全操作，使用锁保护
+        - 只设置令牌，不等待线程结束
         """
         with self.lock:
-            if thread in self.threads:
-                self.threads.remove(thread)
+            for _, owner, token in self.scripts:
+                if (sprite is None or owner is sprite) and token is not exclude:
+                    token.cancel()
     
-    def stop_all_threads(self) -> None:
+    def stop_all_threads(self, timeout: float = 0.5) -> None:
         """
         停止所有线程并等待它们结束
         
+        参数:
+        timeout: 所有线程一共最多等待的秒数
+        
         说明:
-        - 优雅停止：给线程0.5秒时间完成当前操作
-        - 强制清理：超时后强制移除线程引用
-        - 防止内存泄漏：确保所有线程资源被释放
+        - 先一次性取消所有令牌，所有脚本同时开始退出
+        - 再在同一个截止时间内等待，总耗时不会随线程数量增长
+        - 超时未结束的线程是守护线程，随程序退出
         
         使用场景:
         - 程序退出时
         - 项目重新加载时
         - 用户强制停止时
         """
+        self.cancel()
+        deadline = time.monotonic() + timeout
         with self.lock:
-            for thread in self.threads:
-                if thread.is_alive():
-                    # 给线程0.5秒时间优雅退出
-                    thread.join(timeout=0.5)
-            # 清空线程列表，释放所有引用
-            self.threads.clear()
+            scripts, self.scripts = self.scripts, []
+        for thread, _, _ in scripts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if thread is not threading.current_thread():
+                thread.join(timeout=remaining)
 
 # 创建全局线程管理器实例
 thread_manager = ThreadManager()
 
+# 每帧的碰撞/距离查询缓存，主循环每帧调用next_frame
+query_cache = QueryCache()
+
+# 逻辑帧信号，主循环每帧调用advance，等待直到等积木在上面挂起到下一帧
+tick_signal = TickSignal()
+
+# 渲染快照的双缓冲，logic_tick每个逻辑帧发布一次，渲染只读快照
+snapshots = SnapshotBuffer()
+
+# 输入快照，主循环每帧取出所有事件后更新，侦测积木只读inputs.state
+inputs = InputTracker()
+
+# 所有限时积木（滑行、等待、说话几秒）的补间，主循环每帧调用advance
+timers = TimerHeap()
+
           
-from time import sleep
-from rotate import blitRotate
 from variable import *
 
 # 帧率设置
-FPS: int = 50  # 图形渲染帧率（Frames Per Second）
-TPS: int = 50  # 逻辑更新帧率（Ticks Per Second）
+FPS: int = 60  # 图形渲染帧率上限（Frames Per Second），显示跟不上时自动降低
+TPS: int = 30  # 逻辑更新帧率（Ticks Per Second），和Scratch一样固定为30
+MAX_TICKS_PER_FRAME: int = 5  # 一次渲染最多补几个逻辑帧，卡顿太久时丢掉积压的逻辑帧
+
+# 渲染插值：渲染帧率高于逻辑帧率时，在前后两个逻辑帧的位置、方向、大小之间插值绘制
+INTERPOLATE: bool = True
+INTERPOLATE_MAX_DISTANCE: float = 50  # 一个逻辑帧内移动超过这个距离（Scratch单位）视为瞬移，不插值
+
+# 过载策略和旋转缓存，负载高时降低显示框刷新率、旋转精度，必要时隔帧渲染
+load_shedder = LoadShedder(1 / FPS)
+rotation_cache = RotationCache()
+
+# 造型解码方式：False时启动时在后台解码全部造型；
+# True时只解码首帧需要的和根据脚本预测会用到的造型，其余第一次用到时再解码（省内存）
+LAZY_COSTUMES: bool = False
+
+# 解码后造型的磁盘缓存（按资源md5和缩放倍数存放RGBA像素），设为None时不使用
+ASSET_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".scratchrunner", "assets")
+ASSET_CACHE_LIMIT: int = 256 * 1024 * 1024  # 缓存目录大小上限（字节），超出时淘汰最久没用的
+
+# 编译后项目的缓存目录，设为None时每次都重新解析project.json
+PROJECT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".scratchrunner", "projects")
+RUNNER_VERSION = "1"  # 运行器版本，参与项目缓存的键
+
+# 解释器：True时用显式栈执行脚本（见runscript），自定义积木递归多深都不会超过Python的递归上限；
+# False时用原来的递归解释器（runcode）
+STACK_INTERPRETER: bool = True
 
 # 窗口大小设置
 STAGE_SIZE = (960, 720)  # 舞台实际渲染尺寸（Pygame坐标系）
@@ -250,9 +323,10 @@ def S_eval(sprite: "Sprite", flag: str) -> dict:
         # 有些积木没有flag（如编辑器中的圆角监视器块）
         return {}
     
-    # 复制输入和字段字典，避免修改原始数据
-    _input: dict = sprite.blocks[flag]["inputs"].copy()
-    _field: dict = sprite.blocks[flag]["fields"].copy()
+    # 只读取输入和字段字典，不需要复制
+    block = sprite.blocks[flag]
+    _input: dict = block.inputs
+    _field: dict = block.fields
     result = {}
     
     # 处理字段（fields）参数
@@ -358,6 +432,205 @@ def getlist(sprite, id):
         raise ValueError("list not found:"+id)
 list_name_to_id={} 
 
+costume_images = {}  # 资源名 -> 解码好、可以直接绘制的造型图像
+decode_pool = ThreadPoolExecutor(thread_name_prefix="decode")  # 资源解码线程池
+submitted_decodes = set()  # 已经提交给解码线程池的资源名，避免重复提交
+
+def costume_asset_name(costume: dict) -> str:
+    """
+    获取造型在.sb3中的资源名
+    
+    说明:
+    - 新项目有md5ext字段，旧项目只有assetId和dataFormat
+    """
+    name = costume.get("md5ext")
+    if name is None or name not in assets:
+        name = costume["assetId"]+"."+costume["dataFormat"]
+    return name
+
+def load_costume_image(costume: dict) -> pygame.Surface:
+    """
+    加载造型的原始图像（不做任何缩放）
+    
+    参数:
+    costume: project.json中的造型字典
+    
+    返回:
+    pygame.Surface: 解码后的图像
+    """
+    return assets.load_image(costume_asset_name(costume))
+
+def prepare_costume(costume: dict) -> pygame.Surface:
+    """
+    解码造型并计算它的包围盒和凸包
+    
+    参数:
+    costume: project.json中的造型字典
+    
+    返回:
+    pygame.Surface: 可以直接绘制的图像（svg已放大2倍）
+    
+    说明:
+    - 可以在解码线程池中调用，同名资源只保留一份图像
+    - 先查磁盘缓存，命中时不需要解码；解码后写回磁盘缓存
+    - 两个线程同时解码同一个资源时只是重复计算，结果相同
+    """
+    name = costume_asset_name(costume)
+    svg_scale = 2 if costume["dataFormat"] == "svg" else 1
+    image = costume_images.get(name)
+    if image is None and asset_cache is not None:
+        image = asset_cache.load(costume["assetId"], svg_scale)
+    if image is None:
+        image = load_costume_image(costume)
+        if svg_scale != 1:
+            image = pygame.transform.rotozoom(
+                image, 0, svg_scale
+            )  # 位图精度高（否则一个一个点不美观），实际储存时图像会大一些
+        image = image.convert_alpha()
+        if asset_cache is not None:
+            asset_cache.store(costume["assetId"], svg_scale, image)
+    costume_images[name] = image
+    if "hull" not in costume:
+        costume["bounds"], costume["hull"] = costume_geometry(
+            image,
+            costume["rotationCenterX"] * svg_scale,
+            costume["rotationCenterY"] * svg_scale,
+            costume.get("bitmapResolution", 1) * svg_scale,
+        )
+    return image
+
+def costume_image(costume: dict) -> pygame.Surface:
+    """获取造型的图像，还没有解码时当场解码"""
+    image = costume_images.get(costume_asset_name(costume))
+    if image is None:
+        image = prepare_costume(costume)
+    return image
+
+def rotation_centre(costume: dict, size: float) -> tuple:
+    """
+    造型缩放后的旋转中心（Pygame像素）
+
+    说明:
+    - 旋转中心以造型像素为单位，位图一个像素是1/bitmapResolution个Scratch单位
+    """
+    scale_times = (Position.PYGAME[1]-Position.PYGAME[0]) / (Position.SCRATCH[1]-Position.SCRATCH[0])
+    scale_times /= costume.get("bitmapResolution", 1)
+    return (costume["rotationCenterX"]*(size/100)*scale_times,
+            costume["rotationCenterY"]*(size/100)*scale_times)
+
+def submit_decode(costume: dict):
+    """
+    把造型提交给解码线程池（已经解码或已经提交过的跳过）
+    
+    返回:
+    Future或None: 本次没有提交时返回None
+    """
+    name = costume_asset_name(costume)
+    if name in costume_images or name in submitted_decodes:
+        return None
+    submitted_decodes.add(name)
+    return decode_pool.submit(prepare_costume, costume)
+
+def prefetch_costumes(target: "Sprite") -> None:
+    """
+    切换造型后预取接下来可能用到的造型
+    
+    参数:
+    target: 刚切换过造型的角色或舞台
+    
+    说明:
+    - 只在LAZY_COSTUMES模式下有效
+    - 脚本里按顺序切换造型时（见analysis.predict_costumes），在后台解码当前造型的前后造型
+    """
+    if not LAZY_COSTUMES or not target.costume_sequential:
+        return
+    count = len(target.costumes)
+    for index in (target.currentCostume + 1, target.currentCostume - 1):
+        submit_decode(target.costumes[index % count])
+
+def preload_assets(targets: list) -> None:
+    """
+    在线程池中解码项目的所有资源
+    
+    参数:
+    targets: 角色和舞台对象的列表
+    
+    说明:
+    - 舞台和可见角色的当前造型最先提交，它们解码完就返回，第一帧可以开始绘制
+    - 其余造型继续在后台解码
+    - 还没有声音积木，声音不解码
+    - LAZY_COSTUMES模式下其余造型只解码脚本预测会用到的，没预测到的第一次用到时再解码
+    - 等待期间在窗口上显示进度条
+    """
+    first, rest = [], []
+    for target in targets:
+        current = target.currentCostume
+        count = len(target.costumes)
+        predicted = set(target.predicted_costumes)
+        if target.costume_sequential:
+            predicted |= {(current + 1) % count, (current - 1) % count}
+        for index, costume in enumerate(target.costumes):
+            if index == current and (target.isStage or target.visible):
+                first.append(costume)
+            elif not LAZY_COSTUMES or index in predicted:
+                rest.append(costume)
+    futures = [submit_decode(costume) for costume in first]
+    futures = [future for future in futures if future is not None]
+    for costume in rest:
+        submit_decode(costume)
+
+    while True:
+        finished, pending = wait(futures, timeout=1 / FPS)
+        pygame.event.pump()
+        drawprogress(show_screen, len(finished), len(futures))
+        pygame.display.update()
+        if not pending:
+            break
+    for future in futures:
+        future.result()  # 解码出错时在这里抛出
+    logging.info(f"首帧资源解码完成，共{len(futures)}个，后台还有{len(rest)}个造型")
+
+
+
+def resolve_costume(target: "Sprite", requested: str, kind: str = "costume") -> "int | None":
+    """
+    把切换造型/背景积木的输入解析为造型索引
+    
+    参数:
+    target: 角色或舞台
+    requested: 积木的输入（造型名、编号或"next costume"等）
+    kind: "costume"或"backdrop"，决定next/previous/random的写法
+    
+    返回:
+    int: 造型索引；无法解析时返回None，保持当前造型不变
+    
+    说明:
+    - 与Scratch一致：先按名字匹配，再处理next/previous/random，最后按编号（从1开始，循环取模）
+    - 名字通过加载时建立的costume_index查找（克隆体共用同一个字典），不再线性扫描
+    """
+    requested = safe_str(requested)
+    count = len(target.costumes)
+    index = target.costume_index.get(requested)
+    if index is not None:
+        return index
+    if requested == "next " + kind:
+        return (target.currentCostume + 1) % count
+    if requested == "previous " + kind:
+        return (target.currentCostume - 1) % count
+    if requested == "random " + kind:
+        if count <= 1:
+            return target.currentCostume
+        # 随机选一个不同于当前的造型
+        return (target.currentCostume + random.randint(1, count - 1)) % count
+    if requested.strip() == "":
+        return None
+    try:
+        number = float(requested)
+    except ValueError:
+        return None
+    if math.isnan(number) or math.isinf(number):
+        return None
+    return (math.floor(number + 0.5) - 1) % count
 
 
 class Sprite(pygame.sprite.Sprite):
@@ -376,11 +649,12 @@ class Sprite(pygame.sprite.Sprite):
     - currentCostume: 当前造型索引
     - costumes: 造型列表
     - variables: 角色变量字典
-    - blocks: 积木字典
+    - blocks: 积木字典（积木ID -> block.Block）
     - isStage: 是否为舞台
     - clone_mode: 克隆状态（0=原始, 1=克隆体, 2=已删除）
     - words: 说话内容
     - argument_dict: 函数参数存储字典
+    - procedures: 自定义积木索引（见analysis.procedure_index）
     
     积木方法分类:
     - motion_*: 运动相关积木
@@ -418,53 +692,123 @@ class Sprite(pygame.sprite.Sprite):
         """返回角色的正式字符串表示（用于调试）"""
         return self.name
 
-    def draw(self) -> None:
+    @property
+    def pose(self) -> tuple:
+        """
+        角色影响碰撞和距离的状态：(x, y, 方向, 大小, 造型)
+        
+        说明:
+        - 作为查询缓存键的一部分，任何一项改变都会让旧的查询结果失效
+        - 舞台没有方向和大小，用None代替
+        """
+        return (self.x, self.y, getattr(self, "direction", None),
+                getattr(self, "size", None), self.currentCostume)
+
+    def state(self) -> SpriteState:
+        """
+        复制角色当前的可见状态，由logic_tick每个逻辑帧调用，放进渲染快照
+        """
+        if self.isStage:
+            # 舞台没有位置、方向、大小，也总是可见
+            return SpriteState(0, 0, None, None, self.currentCostume, True, self.words)
+        return SpriteState(self.x, self.y, self.direction, self.size,
+                           self.currentCostume, self.visible, self.words)
+
+    @staticmethod
+    def render_pose(state: SpriteState, previous: SpriteState, alpha: float) -> tuple:
+        """
+        绘制用的(x, y, 方向, 大小)
+        
+        参数:
+        state: 当前快照中角色的状态
+        previous: 上一个快照中角色的状态，没有时为None
+        alpha: 距离当前快照经过的时间占一个逻辑帧的比例（0到1）
+        
+        说明:
+        - 在前后两个快照之间线性插值，画面比脚本晚一个逻辑帧，
+          换来高刷新率下连续的动作
+        - 方向按较小的夹角插值
+        - 没有上一个快照（刚创建的克隆体）、关闭插值或者瞬移时直接用当前快照
+        """
+        if not INTERPOLATE or previous is None:
+            return state.x, state.y, state.direction, state.size
+        x0, y0, direction0, size0 = previous[:4]
+        x1, y1, direction1, size1 = state[:4]
+        if math.hypot(x1 - x0, y1 - y0) > INTERPOLATE_MAX_DISTANCE:
+            return x1, y1, direction1, size1
+        turn = (direction1 - direction0 + 180) % 360 - 180
+        return (x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha,
+                direction0 + turn * alpha, size0 + (size1 - size0) * alpha)
+
+    def draw(self, state: SpriteState, previous: SpriteState = None, alpha: float = 1.0) -> None:
         """
         绘制角色到屏幕
         
+        参数:
+        state: 当前快照中角色的状态，绘制只读快照，不读角色的属性
+        previous: 上一个快照中角色的状态，用于插值（见render_pose）
+        alpha: 距离当前快照经过的时间占一个逻辑帧的比例
+        
         说明:
-        - 加载当前造型的图像
-        - 处理SVG和位图格式的不同缩放
+        - 取出当前造型已解码的图像（SVG在解码时已经放大）
         - 舞台角色特殊处理（没有方向属性）
-        - 应用大小缩放和旋转
-        - 设置碰撞遮罩
-        - 绘制说话内容
+        - 应用大小缩放和旋转（结果在rotation_cache中缓存），位置、方向、大小使用插值后的状态
+        - 绘制说话内容，画出来的(图像, rect)保存在drawn中，点击检测用
+        - 碰撞用的图像不在这里计算，见update_hitbox
         """
-        costume = self.costumes[self.currentCostume]
+        costume = self.costumes[state.costume]
         #logging.debug(costume)
         
-        try:
-            image = pygame.image.load(costume["md5ext"])
-        except:
-            image = pygame.image.load(costume["assetId"]+"."+costume["dataFormat"])    
-        
-        if "svg" == costume["dataFormat"]:
-            image = pygame.transform.rotozoom(
-                image, 0, 2
-            )  # 位图精度高（否则一个一个点不美观），实际储存时图像会大一些
+        image = costume_image(costume)  # 已解码、svg已放大的图像
         if self.isStage:
             screen.blit(image, (0, 0))
             return # stage没有direction属性
-        if not self.visible:
+        if not state.visible:
             return
-        if self.size != 100:
-            image = pygame.transform.rotozoom(
-                    image, 0, self.size/100
-                )
-        direction = self.direction % 360  # stage没有direction属性
+        pose_x, pose_y, direction, size = self.render_pose(state, previous, alpha)
+        rotated, scaled_size, angle = rotation_cache.get(
+            image, size, 90 - direction % 360, load_shedder.rotation_step()
+        )  # 缩放、旋转的结果按(图像, 大小, 角度)缓存
         #x, y = positionmap1(self.x, self.y)
-        position = Position(self.x, self.y)
-        x, y = position.pygame()
-        rotatecentre = costume["rotationCenterX"]*(self.size/100), costume["rotationCenterY"]*(self.size/100)
-        scale_times=(Position.PYGAME[1]-Position.PYGAME[0]) / (Position.SCRATCH[1]-Position.SCRATCH[0])
-        print(rotatecentre,scale_times)
-        rotatecentre= rotatecentre[0]*scale_times, rotatecentre[1]*scale_times # 2倍缩放
-        self.image, self.rect = blitRotate(
-            screen, image, (x, y), rotatecentre, 90 - direction
-        )  # 他山之石可以攻玉
-        #pygame.draw.rect(screen, (255, 0, 0), self.rect, 2)
-        
-        drawtext(self, screen)
+        x, y = Position(pose_x, pose_y).pygame()
+        self.drawn = blitRotated(
+            screen, rotated, scaled_size, (x, y), rotation_centre(costume, size), angle
+        )  # 他山之石可以攻玉，(图像, rect)一次性赋值，供点击检测（见sprite_at）
+        drawn_rect = self.drawn[1]
+        #pygame.draw.rect(screen, (255, 0, 0), drawn_rect, 2)
+        
+        drawtext(self, screen, state.words, drawn_rect)
+
+    def update_hitbox(self, state: SpriteState) -> None:
+        """
+        按快照中的逻辑位置、方向、大小计算碰撞用的(图像, rect)
+        
+        参数:
+        state: 当前快照中角色的状态
+        
+        说明:
+        - 碰撞图像每个逻辑帧才会变，由logic_tick发布快照后调用，不随渲染帧重算；
+          位置、方向、大小、造型都没变时直接沿用上一次的结果
+        - 用逻辑状态而不是插值后的状态，碰撞检测不受插值影响
+        - (图像, rect)放在hitbox一个属性里一次赋值，脚本线程不会读到新图像配旧rect
+        - 隐藏的角色不计算，侦测积木对隐藏的角色不读hitbox
+        - 只在主线程调用（rotation_cache不是线程安全的）
+        """
+        pose = state[:5]  # x, y, 方向, 大小, 造型
+        if not state.visible or pose == getattr(self, "hitbox_pose", None):
+            return
+        costume = self.costumes[state.costume]
+        image = costume_image(costume)
+        if self.isStage:
+            self.hitbox = (image, image.get_rect())  # 供颜色侦测合成舞台
+        else:
+            # 没有插值、角度也没有按负载取整时和draw是同一个缓存项，不会多旋转一次
+            rotated, scaled_size, angle = rotation_cache.get(image, state.size, 90 - state.direction % 360)
+            x, y = Position(state.x, state.y).pygame()
+            self.hitbox = blitRotated(
+                screen, rotated, scaled_size, (x, y), rotation_centre(costume, state.size), angle, bilt=False
+            )
+        self.hitbox_pose = pose
 
     def motion_goto(self, flag) -> None:
         """
@@ -515,14 +859,14 @@ class Sprite(pygame.sprite.Sprite):
             x = random.uniform(-240, 240)
             return Position(x, y)
         elif to == "_mouse_":
-            # 获取鼠标当前位置并转换为Scratch坐标系
-            mousepos = Position(*pygame.mouse.get_pos(),"show")
-            return mousepos
+            # 鼠标当前位置（Scratch坐标系）
+            mouse = inputs.state
+            return Position(mouse.mouse_x, mouse.mouse_y)
         else:
             # 查找指定名称的角色并返回其位置
-            for sprite in sprite_list:
-                if sprite.name == to:
-                    return Position(sprite.x, sprite.y)
+            sprite = sprite_by_name.get(to)
+            if sprite is not None:
+                return Position(sprite.x, sprite.y)
         return None
 
     motion_glideto_menu = motion_goto_menu
@@ -626,12 +970,36 @@ class Sprite(pygame.sprite.Sprite):
         - 这是Scratch项目的主要启动事件
         - 通常在项目开始时自动执行
         """
-        #runcode(self, self.blocks[flag]["next"])
+        #runcode(self, self.blocks[flag].next)
         # 这个积木本身不执行任何操作，只是一个事件入口
         # 后续积木由runcode负责执行，之前这里误加了一条，导致执行两遍
         logging.info("绿旗被点击")
-        
-        
+
+    def event_whenkeypressed(self, flag) -> None:
+        """
+        当按下某键事件的入口，和绿旗积木一样本身不执行任何操作
+
+        说明:
+        - 由logic_tick按输入快照触发，从下一个积木开始执行
+        """
+
+    def event_whenthisspriteclicked(self, flag) -> None:
+        """
+        当角色被点击事件的入口，和绿旗积木一样本身不执行任何操作
+
+        说明:
+        - 由dispatch_clicks通过start_hats触发，从下一个积木开始执行
+        """
+
+    def event_whenstageclicked(self, flag) -> None:
+        """
+        当舞台被点击事件的入口，和绿旗积木一样本身不执行任何操作
+
+        说明:
+        - 由dispatch_clicks通过start_hats触发，从下一个积木开始执行
+        """
+
+
 
     def control_if(self, flag: str) -> None:
         """
@@ -693,16 +1061,19 @@ class Sprite(pygame.sprite.Sprite):
         - 条件不成立时持续等待
         
         说明:
-        - 使用无限循环不断检查条件
+        - 条件不成立时挂起到下一帧（tick_signal）再检查，每帧只计算一次条件，
+          不会忙等占用CPU
         - 条件表达式通过runcode执行并返回字符串"True"或"False"
-        - 注意：如果条件永远不成立，会导致线程阻塞
+        - 脚本被停止时立即退出等待
         """
         dic=S_eval(self,flag)
         condition=dic["CONDITION"]
         logging.debug(condition)
-        while 1:
+        token=current_token()
+        while not token.cancelled:
             if runcode(self,condition)=="True":
-                break         
+                break
+            tick_signal.wait(token)
     def control_repeat(self, flag) -> None:
         """
         重复执行指定次数
@@ -716,17 +1087,18 @@ class Sprite(pygame.sprite.Sprite):
         
         说明:
         - 使用for循环控制重复次数
-        - 每次循环都会检查克隆体状态
+        - 每次循环都会检查克隆体状态，每轮结束等到下一个逻辑帧
         - 使用safe_int确保次数为整数
         """
         dic = S_eval(self, flag)
-        if self.blocks[flag]["inputs"]["SUBSTACK"][1] is None:
+        if self.blocks[flag].inputs["SUBSTACK"][1] is None:
             return
+        token = current_token()
         for _ in range(safe_int(dic["TIMES"])):
-            if self.clone_mode==2:
+            if self.clone_mode==2 or token.cancelled:
                 break
-            runcode(self, self.blocks[flag]["inputs"]["SUBSTACK"][1])
-            
+            runcode(self, self.blocks[flag].inputs["SUBSTACK"][1])
+            tick_signal.wait(token)  # 每轮循环结束等到下一个逻辑帧
 
     def control_forever(self, flag: str) -> None:
         """
@@ -741,15 +1113,16 @@ class Sprite(pygame.sprite.Sprite):
         
         说明:
         - 使用while True无限循环
-        - 每次循环都会检查克隆体状态
+        - 每次循环都会检查克隆体状态，每轮结束等到下一个逻辑帧
         - 通常用于持续性的行为或动画
         """
+        token = current_token()
         while 1:
             # self.x=1
-            if self.clone_mode==2:
+            if self.clone_mode==2 or token.cancelled:
                 break
-            runcode(self, self.blocks[flag]["inputs"]["SUBSTACK"][1])
-            clock.tick(TPS)
+            runcode(self, self.blocks[flag].inputs["SUBSTACK"][1])
+            tick_signal.wait(token)  # 每轮循环结束等到下一个逻辑帧
 
     def control_wait(self, flag: str) -> None:
         """
@@ -763,12 +1136,12 @@ class Sprite(pygame.sprite.Sprite):
         - 时间单位为秒，支持小数
         
         说明:
-        - 使用time.sleep实现等待
-        - 等待期间线程阻塞，不执行其他操作
+        - 在计时器堆上登记补间，主循环在到时间后的第一帧唤醒脚本
+        - 脚本被停止时立即结束等待
         - 常用于制作延时效果或动画间隔
         """
-        sleeptime = float(S_eval(self, flag)["DURATION"])
-        sleep(sleeptime)
+        sleeptime = safe_float(S_eval(self, flag)["DURATION"])
+        timers.add(sleeptime).wait(current_token())
 
     def motion_pointindirection(self, flag:str) -> None:
         """
@@ -788,6 +1161,26 @@ class Sprite(pygame.sprite.Sprite):
         direction = float(S_eval(self, flag)["DIRECTION"])
         self.direction = direction
 
+    def glide(self, secs: float, x: float, y: float) -> None:
+        """
+        在指定时间内从当前位置滑行到(x, y)
+        
+        参数:
+        secs: 滑行时间（秒）
+        x, y: 目标位置（Scratch坐标系）
+        
+        说明:
+        - 在计时器堆上登记补间，主循环每帧按经过的时间插值位置，
+          移动的平滑程度跟随实际帧率，总时间不受线程调度影响
+        - 结束时正好停在目标位置；脚本被停止时停在当前位置
+        """
+        start_x, start_y = self.x, self.y
+
+        def update(fraction: float) -> None:
+            self.x = start_x + (x - start_x) * fraction
+            self.y = start_y + (y - start_y) * fraction
+        timers.add(secs, update).wait(current_token())
+
     def motion_glideto(self, flag) -> None:
         """
         在指定时间内滑行到目标位置
@@ -796,23 +1189,14 @@ class Sprite(pygame.sprite.Sprite):
         flag: 积木标识符
         
         功能:
-        - 在指定时间内平滑移动到目标位置
-        - 使用线性插值计算移动向量
-        - 分100步完成移动，实现平滑动画效果
+        - 在指定时间内平滑移动到目标位置（随机位置、鼠标或其他角色）
         
         说明:
-        - 计算从当前位置到目标位置的向量
-        - 将总时间分为100个小时间段
-        - 每个时间段移动1/100的距离
+        - 目标位置在开始滑行时确定，之后目标移动不影响滑行
+        - 插值见glide
         """
         dic = S_eval(self, flag)
-        secs, to = dic["SECS"], dic["TO"]
-        # 计算移动向量 (Δx/100, Δy/100)
-        vec = ((to[0] - self.x) / 100, (to[1] - self.y) / 100)
-        for _ in range(100):
-            sleep(float(secs) / 100)  # 每次等待总时间的1/100
-            self.x += vec[0]  # 移动x坐标
-            self.y += vec[1]  # 移动y坐标
+        self.glide(safe_float(dic["SECS"]), *dic["TO"].scratch())
 
     def motion_glidesecstoxy(self, flag:str) -> None:
         """
@@ -823,13 +1207,12 @@ class Sprite(pygame.sprite.Sprite):
         
         功能:
         - 在指定时间内平滑移动到指定x,y坐标
-        - 使用线性插值计算移动向量
-        - 分100步完成移动，实现平滑动画效果
         
         说明:
-        - 与motion_glideto类似，但直接指定目标坐标
-        -
+        - 与motion_glideto类似，但直接指定目标坐标，插值见glide
         """
+        dic = S_eval(self, flag)
+        self.glide(safe_float(dic["SECS"]), safe_float(dic["X"]), safe_float(dic["Y"]))
 
     def motion_setx(self, flag:str) -> None:
         x = S_eval(self, flag)["X"]
@@ -862,7 +1245,8 @@ class Sprite(pygame.sprite.Sprite):
 
             return direction
         if dic["TOWARDS"] == "_mouse_":
-            mousepos = Position(*pygame.mouse.get_pos(),"show")
+            mouse = inputs.state
+            mousepos = Position(mouse.mouse_x, mouse.mouse_y)
 
             #mousepos = positionmap2(mousepos[0], mousepos[1])
             return pos2angle(*mousepos.scratch())
@@ -872,35 +1256,69 @@ class Sprite(pygame.sprite.Sprite):
             direction = random.uniform(0, 360)
             return direction
         else:
-            for sprite in sprite_list:
-                if sprite.name == dic["TOWARDS"]:
-                    return pos2angle(sprite.x, sprite.y)
+            sprite = sprite_by_name.get(dic["TOWARDS"])
+            if sprite is not None:
+                return pos2angle(sprite.x, sprite.y)
+    def get_bounds(self) -> tuple:
+        """
+        获取角色在舞台上的紧凑包围盒
+        
+        返回:
+        (left, right, bottom, top): Scratch坐标系中不透明部分的包围盒
+        
+        说明:
+        - 由加载时算好的造型凸包根据位置、方向、大小解析变换得到
+        - 不依赖渲染线程是否已经绘制过这个角色
+        """
+        costume = self.costumes[self.currentCostume]
+        if "hull" not in costume:
+            prepare_costume(costume)  # 后台还没有解码到这个造型
+        hull = costume["hull"]
+        return transform_bounds(hull, self.x, self.y, self.direction, self.size)
     def motion_ifonedgebounce(self, flag:str=None):
-        # 其实遇到边缘就反弹没有任何参数   
-        #logging.debug((self.x>0,((self.direction%360)>180)))    
-        if not (Position.PYGAME[0] <=self.rect.left <= self.rect.right <= Position.PYGAME[1]):
-            
-            if (self.x>0)+((self.direction%360)>180)==1:#在已经转向的情况下不会转回去
-                self.direction = -self.direction
-                self.direction %= 360  # 找了好一会为什么层层设卡还是有超出360的情况
-                logging.debug("碰撞")
-            """
-            if self.x < 0:
-                self.x = -480 - self.x
-            else:
-                self.x = 480 - self.x"""
-
-        #logging.debug((self.y>0,( (90<(self.direction%360)<270)))) 
-        if not (Position.PYGAME[3] <= self.rect.top <= self.rect.bottom <= Position.PYGAME[2]):
-            if bool(self.y>0)+(90<(self.direction%360)<270)==1:#没好
-                #self.direction = -self.direction
-                logging.debug("碰撞")
-               
-                    #if (self.y>0)+(not (90<(self.direction%360)<270))==1:#在已经转向的情况下不会转回去
-                #self.direction = -self.direction
-                #logging.debug("碰撞")
-                self.direction = 180 - self.direction
-            #logging.debug("碰撞")
+        """
+        碰到边缘就反弹
+        
+        说明:
+        - 与Scratch相同：找到越界最多的边，把方向朝舞台内侧翻转，再把角色推回舞台内
+        - 其实遇到边缘就反弹没有任何参数
+        """
+        left, right, bottom, top = self.get_bounds()
+        half_width = (Position.SCRATCH[1] - Position.SCRATCH[0]) / 2
+        half_height = (Position.SCRATCH[3] - Position.SCRATCH[2]) / 2
+        distances = {
+            "left": max(0, half_width + left),
+            "top": max(0, half_height - top),
+            "right": max(0, half_width - right),
+            "bottom": max(0, half_height + bottom),
+        }
+        nearest = min(distances, key=distances.get)
+        if distances[nearest] > 0:
+            return  # 没有碰到边缘
+        logging.debug("碰撞")
+        angle = radians(90 - self.direction)
+        dx = cos(angle)
+        dy = -sin(angle)  # 与Scratch一样，这里y向下为正
+        if nearest == "left":
+            dx = max(0.2, abs(dx))
+        elif nearest == "top":
+            dy = max(0.2, abs(dy))
+        elif nearest == "right":
+            dx = -max(0.2, abs(dx))
+        else:
+            dy = -max(0.2, abs(dy))
+        self.direction = (math.degrees(math.atan2(dy, dx)) + 90) % 360
+
+        # 把角色推回舞台内
+        left, right, bottom, top = self.get_bounds()
+        if left < -half_width:
+            self.x += -half_width - left
+        elif right > half_width:
+            self.x -= right - half_width
+        if bottom < -half_height:
+            self.y += -half_height - bottom
+        elif top > half_height:
+            self.y -= top - half_height
     def motion_xposition(self,flag=None) ->str:#取前9位，否则变量显示太难看
         return safe_str(self.x)[0:9]
     def motion_yposition(self,flag=None) ->str:
@@ -962,7 +1380,7 @@ class Sprite(pygame.sprite.Sprite):
         功能:
         - 在角色上方显示指定的说话内容
         - 等待指定时间后自动清除说话内容
-        - 使用time.sleep实现定时功能
+        - 在计时器堆上等待，脚本被停止时立即结束等待
         
         说明:
         - 支持小数秒数（如0.5秒）
@@ -973,7 +1391,7 @@ class Sprite(pygame.sprite.Sprite):
         secs = safe_float(dic["SECS"])
         message = safe_str(dic["MESSAGE"])
         self.words = message
-        sleep(secs)
+        timers.add(secs).wait(current_token())
         self.words = ""
     
     looks_thinkforsecs = looks_sayforsecs
@@ -992,17 +1410,16 @@ class Sprite(pygame.sprite.Sprite):
         
         说明:
         - 造型名称必须完全匹配（区分大小写）
-        - 如果找不到指定名称的造型，保持当前造型不变
-        - 造型列表存储在self.costumes属性中
+        - 也支持造型编号和"next costume"/"previous costume"/"random costume"
+        - 如果无法解析，保持当前造型不变
+        - 解析由resolve_costume完成，名字查找是O(1)的
         """
         dic = S_eval(self, flag)
         logging.debug(dic)
-        count = 0
-        for costume in self.costumes:
-            if costume["name"] == dic["COSTUME"]:
-                self.currentCostume = count
-                break
-            count += 1
+        index = resolve_costume(self, dic["COSTUME"])
+        if index is not None:
+            self.currentCostume = index
+            prefetch_costumes(self)
     
     def looks_costume(self, flag: str) -> str:
         """
@@ -1078,6 +1495,7 @@ class Sprite(pygame.sprite.Sprite):
         self.currentCostume += 1
         if self.currentCostume == costumecount:
             self.currentCostume = 0
+        prefetch_costumes(self)
     
     def looks_changesizeby(self, flag: str) -> None:
         """
@@ -1128,16 +1546,15 @@ class Sprite(pygame.sprite.Sprite):
         
         说明:
         - 背景名称必须完全匹配（区分大小写）
-        - 如果找不到指定名称的背景，保持当前背景不变
+        - 也支持背景编号和"next backdrop"/"previous backdrop"/"random backdrop"
+        - 如果无法解析，保持当前背景不变
         - 背景列表存储在stage.costumes属性中
         """
         dic = S_eval(self, flag)
-        count = 0
-        for costume in stage.costumes:
-            if costume["name"] == dic["BACKDROP"]:
-                stage.currentCostume = count
-                break
-            count += 1
+        index = resolve_costume(stage, dic["BACKDROP"], "backdrop")
+        if index is not None:
+            stage.currentCostume = index
+            prefetch_costumes(stage)
     
     def looks_backdrops(self, flag: str) -> str:
         """
@@ -1158,7 +1575,7 @@ class Sprite(pygame.sprite.Sprite):
         - 背景名称来自stage.costumes列表中的name字段
         """
         dic = S_eval(self, flag)
-        return dic["COSTUME"]
+        return dic["BACKDROP"]
     
     def looks_nextbackdrop(self, flag: str = None) -> None:
         """
@@ -1179,6 +1596,7 @@ class Sprite(pygame.sprite.Sprite):
         stage.currentCostume += 1
         if stage.currentCostume == costumecount:
             stage.currentCostume = 0
+        prefetch_costumes(stage)
     
     def looks_costumenumbername(self, flag: str) -> str:
         """
@@ -1632,9 +2050,29 @@ class Sprite(pygame.sprite.Sprite):
         logging.debug(self.variables)
         logging.debug(stage.variables)
     def control_stop(self,flag):
-        global done
-        #logging.error("结束了")
-        done=True
+        """
+        停止积木
+        
+        参数:
+        flag: 积木标识符
+        
+        功能:
+        - "this script": 停止当前脚本
+        - "other scripts in sprite"/"other scripts in stage": 停止这个角色（克隆体）的其他脚本
+        - "all": 停止所有脚本、删除所有克隆体、停止所有声音，窗口保持打开
+        
+        说明:
+        - 通过取消令牌停止，脚本在下一个检查点退出
+        - 显式栈解释器中"this script"由stack_stop处理：在自定义积木里只从这个自定义积木返回
+        """
+        option=self.blocks[flag].fields["STOP_OPTION"][0]
+        token=current_token()
+        if option=="this script":
+            token.cancel()
+        elif option.startswith("other scripts"):
+            thread_manager.cancel(self,exclude=token)
+        else:
+            stop_all()
     def data_addtolist(self,flag):
         dic=S_eval(self,flag)
         #logging.debug(dic)
@@ -1740,19 +2178,20 @@ class Sprite(pygame.sprite.Sprite):
     def control_create_clone_of(self,flag):
         dic=S_eval(self,flag)
         logging.debug(dic)
-        import copy
-        newsprite=self.copy()
+        if dic["CLONE_OPTION"]=="_myself_":
+            original=self
+        else:
+            original=sprite_by_name.get(dic["CLONE_OPTION"])
+            if original is None:
+                logging.error("没有找到"+dic["CLONE_OPTION"]+"这个角色")
+                return
+        newsprite=original.copy()
         newsprite.clone_mode=1
         clone_list.append(newsprite)
-        thread_list=[]
+        clones_by_name.setdefault(newsprite.name,[]).append(newsprite)
         for flag, code in newsprite.blocks.items():
-            if code["opcode"] == "control_start_as_clone":
-
-                thread = threading.Thread(
-                    name=str(newsprite) + flag+" clone", target=runcode, args=(newsprite, flag)
-                )
-                thread_list.append(thread)
-                thread.start()
+            if code.opcode == "control_start_as_clone":
+                thread_manager.start_script(newsprite, flag, str(newsprite) + flag+" clone")
     def control_create_clone_of_menu(self,flag)-> dict:        
         dic=S_eval(self,flag)
         logging.debug(dic)
@@ -1761,16 +2200,22 @@ class Sprite(pygame.sprite.Sprite):
         import copy
         return self.__class__(copy.copy(self.__dict__))
     def control_start_as_clone(self,flag):
-        
-        runcode(self,self.blocks[flag]["next"])
+        # 和绿旗积木一样只是入口，后续积木由runcode负责执行
+        logging.info("作为克隆体启动")
     def control_delete_this_clone(self,flag):
         if self.clone_mode==1:
             self.clone_mode=2   
+            #从克隆体索引和绘制列表中移除，取消这个克隆体的所有脚本
+            thread_manager.cancel(self)
+            clones=clones_by_name.get(self.name,[])
+            if self in clones:
+                clones.remove(self)
+            if self in clone_list:
+                clone_list.remove(self)
     def sensing_keypressed(self,flag):
         dic=S_eval(self,flag)
         logging.debug(dic)
-        import keymap
-        return safe_str(keys_pressed[keymap.keymap[dic["KEY_OPTION"]]])
+        return safe_str(inputs.state.key_pressed(dic["KEY_OPTION"]))
     def sensing_keyoptions(self,flag):  
         dic=S_eval(self,flag)
         logging.debug(dic)
@@ -1780,25 +2225,53 @@ class Sprite(pygame.sprite.Sprite):
         return safe_str(time.time()-stage.time)
     def sensing_resettimer(self,flag=None):
         stage.time=time.time()
+    def sensing_setdragmode(self,flag):
+        #拖动由主循环的dispatch_clicks处理，这里只改变角色的draggable属性
+        dic=S_eval(self,flag)
+        logging.debug(dic)
+        self.draggable=dic["DRAG_MODE"]=="draggable"
     def collision(self,others:"Sprite"|Literal["_mouse_"]):
+        """
+        碰撞检测（带每帧缓存）
+        
+        参数:
+        others: 另一个角色，或者"_mouse_"、"_edge_"
+        
+        说明:
+        - 同一帧内、双方状态都没变时，重复查询直接返回缓存的结果
+        """
+        if others == "_mouse_":
+            mouse = inputs.state
+            others_state = (mouse.mouse_x, mouse.mouse_y)
+        elif others == "_edge_":
+            others_state = None
+        else:
+            others_state = others.pose
+        return query_cache.get(("collision", self, others, self.pose, others_state),
+                               lambda: self._collision(others))
+    def _collision(self,others:"Sprite"|Literal["_mouse_"]):
         logging.debug(others)   
+        hitbox = getattr(self, "hitbox", None)  # 只读一次，图像和rect一定是同一次计算的
         if others=="_mouse_":
-            mouse_pos=pygame.mouse.get_pos()
-            mouse_pos=Position(mouse_pos[0],mouse_pos[1],"show").pygame()
+            if hitbox is None:
+                return False  # 还没有计算过碰撞图像
+            mouse=inputs.state
+            mouse_pos=Position(mouse.mouse_x,mouse.mouse_y).pygame()
 
             mouse_rect = pygame.Rect(mouse_pos[0], mouse_pos[1], 1, 1)
             mouse_image = pygame.Surface((1, 1), pygame.SRCALPHA)
             mouse_image.fill((255, 255, 255, 255))  # 创建一个完全不透明的白色像素
             #logging.debug(others.rect)
-            return check_collision(self.rect,self.image,mouse_rect,mouse_image)
+            return check_collision(hitbox[1],hitbox[0],mouse_rect,mouse_image)
         if others=="_edge_":
-            if not (Position.PYGAME[0] <=self.rect.left <= self.rect.right <= Position.PYGAME[1]):
-                return True
-            if not (Position.PYGAME[2] <=self.rect.top <= self.rect.bottom <= Position.PYGAME[3]):
-                return True
-            return False
+            left, right, bottom, top = self.get_bounds()
+            return (left < Position.SCRATCH[0] or right > Position.SCRATCH[1]
+                    or bottom < Position.SCRATCH[2] or top > Position.SCRATCH[3])
+        other_hitbox = getattr(others, "hitbox", None)
+        if hitbox is None or other_hitbox is None:
+            return False  # 还没有计算过碰撞图像
                  
-        return check_collision(self.rect,self.image,others.rect,others.image)         
+        return check_collision(hitbox[1],hitbox[0],other_hitbox[1],other_hitbox[0])         
             
                 
     def sensing_touchingobject(self,flag):
@@ -1808,49 +2281,113 @@ class Sprite(pygame.sprite.Sprite):
             return safe_str(self.collision("_mouse_"))
         if dic["TOUCHINGOBJECTMENU"]=="_edge_":
             return safe_str(self.collision("_edge_"))
-        for i in sprite_list:
-            if i.name==dic["TOUCHINGOBJECTMENU"]:
-                return safe_str(self.collision(i))
-        else:
+        original=sprite_by_name.get(dic["TOUCHINGOBJECTMENU"])
+        if original is None:
             raise Exception("没有找到"+dic["TOUCHINGOBJECTMENU"]+"这个角色")    
+        #和Scratch一样，碰到角色本体或者它的任意一个克隆体都算
+        for i in [original]+clones_by_name.get(original.name,[]):
+            if i is not self and self.collision(i):
+                return safe_str(True)
+        return safe_str(False)
+    def touching_layers(self) -> list:
+        """
+        获取除自己以外、按绘制顺序排列的所有图层
+        
+        返回:
+        list: (image, rect)列表，舞台在最前，只包含已经计算过碰撞图像的可见角色
+        """
+        layers = []
+        for i in sprite_list + clone_list:
+            if i is self or i.clone_mode == 2:
+                continue
+            if not (i.isStage or i.visible):
+                continue
+            hitbox = getattr(i, "hitbox", None)
+            if hitbox is None:
+                continue
+            layers.append(hitbox)
+        return layers
+    def sensing_touchingcolor(self, flag) -> str:
+        """
+        碰到颜色积木
+        
+        参数:
+        flag: 积木标识符
+        
+        返回:
+        str: "True" 或 "False" 字符串
+        
+        说明:
+        - 把角色下方的舞台和其他角色合成后，与COLOR按Scratch的容差比较
+        - 角色还没有计算过碰撞图像（没有hitbox）或者隐藏时视为没有碰到
+        """
+        dic = S_eval(self, flag)
+        hitbox = getattr(self, "hitbox", None)
+        if not self.visible or hitbox is None:
+            return safe_str(False)
+        return safe_str(check_touching_color(
+            hitbox[1], hitbox[0], self.touching_layers(), screen.get_rect(),
+            parse_color(dic["COLOR"])
+        ))
+    def sensing_coloristouchingcolor(self, flag) -> str:
+        """
+        颜色碰到颜色积木
+        
+        参数:
+        flag: 积木标识符
+        
+        返回:
+        str: "True" 或 "False" 字符串
+        
+        说明:
+        - 只取角色自身颜色为COLOR的像素，检查这些像素下方是否为COLOR2
+        """
+        dic = S_eval(self, flag)
+        hitbox = getattr(self, "hitbox", None)
+        if not self.visible or hitbox is None:
+            return safe_str(False)
+        return safe_str(check_touching_color(
+            hitbox[1], hitbox[0], self.touching_layers(), screen.get_rect(),
+            parse_color(dic["COLOR2"]), mask_color=parse_color(dic["COLOR"])
+        ))
     def sensing_touchingobjectmenu(self,flag):
         dic=S_eval( self,flag)  
         logging.debug(dic)
         return dic['TOUCHINGOBJECTMENU']
-    def sensing_distancetomenu(self,flag) -> Position :
+    def sensing_distancetomenu(self,flag) -> "Position | Sprite":
         
         dic=S_eval(self,flag)
         logging.debug(dic)
         if dic["DISTANCETOMENU"]=="_mouse_":
-            mouse_x,mouse_y=pygame.mouse.get_pos()
-            return Position(mouse_x,mouse_y,"show")
+            mouse=inputs.state
+            return Position(mouse.mouse_x,mouse.mouse_y)
         else:
-            for i in sprite_list:
-                if i.name==dic["DISTANCETOMENU"]:
-                    return Position(i.x,i.y)
+            #返回角色本身，距离积木据此缓存查询结果
+            return sprite_by_name.get(dic["DISTANCETOMENU"])
     def sensing_distanceto(self,flag) -> str:
         dic=S_eval(self,flag)
         logging.debug(dic)
-        
-        dest_x,dest_y=dic["DISTANCETOMENU"].scratch()
-        
-        x,y=self.x,self.y
-        logging.debug((x,y))
-        x=safe_float(x-dest_x)
-        y=safe_float(y-dest_y)
-        logging.debug((x,y))
-        return safe_str(math.sqrt(x**2+y**2))
+        dest=dic["DISTANCETOMENU"]
+        
+        def distance():
+            dest_x,dest_y=(dest.x,dest.y) if isinstance(dest,Sprite) else dest.scratch()
+            x=safe_float(self.x-dest_x)
+            y=safe_float(self.y-dest_y)
+            return safe_str(math.sqrt(x**2+y**2))
+        if isinstance(dest,Sprite):
+            return query_cache.get(("distance", self, dest, self.pose, dest.pose), distance)
+        return distance()
     def sensing_mousedown(self,flag):
         dic=S_eval(self,flag)
         logging.debug(dic)
-        return safe_str(pygame.mouse.get_pressed()[0])
+        return safe_str(inputs.state.mouse_down)
     def sensing_mousex(self,flag):
         """
         由于要传到scratch层，所以按照scratch的坐标系
         """
         dic=S_eval(self,flag)
         logging.debug(dic)
-        return safe_str(pygame.mouse.get_pos()[0]/2-240)
+        return safe_str(inputs.state.mouse_x)
     def sensing_mousey(self,flag):
         """
         由于要传到scratch层，所以按照scratch的坐标系
@@ -1858,7 +2395,7 @@ class Sprite(pygame.sprite.Sprite):
         dic=S_eval(self,flag)
         logging.debug(dic)
 
-        return safe_str(180-pygame.mouse.get_pos()[1]/2)
+        return safe_str(inputs.state.mouse_y)
     def sensing_dayssince2000(self,flag):
         dic=S_eval(self,flag)
         logging.debug(dic)
@@ -1872,46 +2409,17 @@ class Sprite(pygame.sprite.Sprite):
         return safe_str(100)
     def procedures_call(self,flag2):
         dic=S_eval(self,flag2)
-        #procedures_definition
-        tagname=self.blocks[flag2]["mutation"]["proccode"]
-        #logging.debug(tagname)
-        for flag1, code in self.blocks.items():
-            if code["opcode"] == "procedures_prototype":
-                flag_procedure_prototype=flag1
-                
-        for flag1, code in self.blocks.items():  
-            try:
-                if code["inputs"]["custom_block"][1]== flag_procedure_prototype:
-                    flag_procedure_definition=flag1
-            except:
-                pass         
-        self.procedure({
-            "flag_procedure_prototype":flag_procedure_prototype,
-            "flag_procedure_definition":flag_procedure_definition,
-            "tagname":tagname,
-            "callerflag":flag2,
-
-        },
-        dic
-        )           
-    def procedure(self,flags,argcs):
-        logging.debug((self,flags,argcs))
-        
-        for key,value in argcs.items():
+        tagname=self.blocks[flag2].mutation["proccode"]
+        if tagname not in self.procedures:
+            logging.error(f"没有找到自定义积木{tagname}的定义")
+            return
+        definition, argument_names, _ = self.procedures[tagname]
+        for key,value in dic.items():
             #在读取参数时，scratch完全按照名字检索，所以要把id转成名字
-            mutation=self.blocks[flags["flag_procedure_prototype"]]["mutation"]
-            #去你妈的，mutation["argumentids"]是一个字符串，长得像一个列表，像这样 '["a","b","c"]'
-            #在字符状态下，先全部统一大写，然后再用eval转成列表，再用zip和dict转成字典
-            #最后实现这样的效果
-            #dict1={'FWV;F_+X!EOJ}8AFV[*)': 'content', 'VS}LUVVOE?WQMI#.^D}P': 'secs'}
-            mutation["argumentids"]="".join(list(map(str.upper,mutation["argumentids"])))
-            dict1=dict(zip(eval(mutation["argumentids"]),eval(mutation["argumentnames"])))
-            logging.debug(dict1)
-            name=dict1[key]
-            
-            self.argument_dict[(threading.current_thread(),name)]=value
-            logging.debug(self.argument_dict)
-        runcode(self,flags["flag_procedure_definition"])
+            if key in argument_names:
+                self.argument_dict[(threading.current_thread(),argument_names[key])]=value
+        logging.debug(self.argument_dict)
+        runcode(self,definition)
 
     def argument_reporter_string_number(self,flag):
         #按照变量名获取参数
@@ -1922,13 +2430,34 @@ class Sprite(pygame.sprite.Sprite):
         logging.debug(self.argument_dict)
         return self.argument_dict[(threading.current_thread(),dic["VALUE"])]    
             
-    procedure_definition=event_whenflagclicked
+    def procedures_definition(self, flag) -> None:
+        """
+        自定义积木的定义（帽子积木）
+        
+        说明:
+        - 和绿旗积木一样只是入口，本身不执行任何操作，
+          定义下面的积木由runcode顺序执行
+        """
+    procedures_prototype=procedures_definition  # 原型只用来保存参数信息，不会被执行
     
     
             
         
 
 
+# 积木的分类前缀，Sprite上以这些前缀开头的方法是积木处理函数
+OPCODE_PREFIXES = ("motion_", "looks_", "control_", "sensing_", "data_", "operator_",
+                   "event_", "procedures_", "argument_")
+
+# 积木处理函数表：opcode -> Sprite上的同名方法（未绑定的函数）
+# runcode直接查表，不用每个积木都getattr一次、创建一次绑定方法
+# 只收录积木分类前缀开头的方法，get_bounds、render_pose等辅助方法不在表里
+Sprite.handlers = {
+    name: function for name, function in vars(Sprite).items()
+    if name.startswith(OPCODE_PREFIXES) and callable(function)
+}
+
+
 class Monitor:
     def __str__(self):
         return self.params["VARIABLE"]
@@ -1956,39 +2485,42 @@ class Monitor:
         #project.json是这么处理的
 
         if self.spriteName is not  None:
-            for i in sprite_list:               
-                if str(i)==self.spriteName:
-                    self.sprite=i
+            self.sprite=sprite_by_name.get(self.spriteName,stage)
             
         if self.mode=="list":
             self.show_y=0    
         #logging.debug(self.mode)
-    def draw(self):
-        #logging.debug(self.__dict__)
-        if not self.visible:
-            return
-        variablename=self.id
+    def current_value(self):
+        """
+        显示框当前显示的值，由logic_tick每个逻辑帧调用，放进渲染快照
         
+        说明:
+        - 列表复制成元组，渲染时脚本再修改列表也不影响
+        """
+        variablename=self.id
         sprite=self.sprite        
         if self.opcode=="data_variable":
-                    
-            value=getvaluable(sprite,variablename)
-            #logging.debug(self.params["VARIABLE"])
-            #logging.debug(value)
-            #text=" "+self.params["VARIABLE"]+":"+value+" "
-            """
-            if sprite!=stage:
-                text=" "+str(sprite)+text"""
-            drawvariable(self,value,screen)
+            return getvaluable(sprite,variablename)
         elif self.opcode=="data_listcontents":
-            thelist=getlist(sprite,self.id)
-            drawlist(self,thelist,screen)    
+            return tuple(getlist(sprite,self.id))
         else:
-            value=getattr(sprite,self.opcode)(None)
             #这些当做显示框的积木都不用输入参数
             #但输入时需要输入参数，所以这里用None代替
-            front=" "+str(sprite)+":"+self.opcode.replace("motion_","")
-            drawvariable(self,front+value,screen)
+            return getattr(sprite,self.opcode)(None)
+    def draw(self, value, surface=None):
+        #value是快照中显示框的值（见current_value）
+        #surface为None时直接画在舞台上
+        if surface is None:
+            surface=screen
+        if not self.visible:
+            return
+        if self.opcode=="data_variable":
+            drawvariable(self,value,surface)
+        elif self.opcode=="data_listcontents":
+            drawlist(self,value,surface)    
+        else:
+            front=" "+str(self.sprite)+":"+self.opcode.replace("motion_","")
+            drawvariable(self,front+value,surface)
 
          
 
@@ -1998,7 +2530,8 @@ def runcode(sprite: Sprite, flag: str,should_next: str = True)  :
     这样可以集成一个控制器，防止递归调用
     """
     global done
-    if done:
+    token = current_token()
+    if done or token.cancelled:
         return
 
     if flag is None:
@@ -2006,15 +2539,11 @@ def runcode(sprite: Sprite, flag: str,should_next: str = True)  :
         
 
 
-    logging.info(f"进入{sprite.name}的{sprite.blocks[flag]['opcode']}函数")
+    opcode = sprite.blocks[flag].opcode
+    logging.info(f"进入{sprite.name}的{opcode}函数")
     result = None
-    try:
-        func = getattr(sprite, sprite.blocks[flag]["opcode"])
-            
-    except AttributeError:
-        logging.error(f"缺少函数{sprite.blocks[flag]['opcode']}")
     try: 
-        result = func(flag)    
+        result = Sprite.handlers[opcode](sprite, flag)
     except Exception as e:
         
         logging.error(f"执行积木{flag}时出错: {traceback.format_exc()}")
@@ -2025,18 +2554,231 @@ def runcode(sprite: Sprite, flag: str,should_next: str = True)  :
         #之后的积木都在这里顺序执行
         logging.debug("进入顺序执行控制器")
         #breakpoint()
-        next_flag=sprite.blocks[flag].get("next")
+        next_flag=sprite.blocks[flag].next
         while next_flag!=None:
-            if sprite.clone_mode==2:
+            if sprite.clone_mode==2 or token.cancelled:
                 return
         
             runcode(sprite=sprite, flag=next_flag,should_next=False)
-            next_flag=sprite.blocks[next_flag].get("next")
+            next_flag=sprite.blocks[next_flag].next
 
         
             
     return result
 
+def stop_all() -> None:
+    """
+    停止全部（停止积木的"all"选项）
+    
+    说明:
+    - 取消所有脚本，删除所有克隆体，清除说话内容，停止所有声音
+    - 和Scratch一样只停止项目，窗口保持打开，之后按键等事件仍然可以启动新脚本
+    """
+    thread_manager.cancel()
+    for clone in clone_list[:]:
+        clone.clone_mode = 2
+    clone_list.clear()
+    clones_by_name.clear()
+    for sprite in sprite_list:
+        sprite.words = ""
+    if pygame.mixer.get_init():
+        pygame.mixer.stop()
+
+# 显式栈解释器的栈帧类型
+BLOCK = 0    # (BLOCK, 积木ID)：执行这个积木，之后执行它的下一个积木
+REPEAT = 1   # (REPEAT, 循环体, 剩余次数)：重复执行积木的循环，循环体执行完一遍后出栈
+FOREVER = 2  # (FOREVER, 循环体)：重复执行积木的循环，循环体执行完一遍后出栈
+RETURN = 3   # (RETURN, 调用前的参数, 是否不刷新屏幕)：自定义积木执行完，恢复调用者的参数
+
+def runscript(sprite: Sprite, flag: str) -> None:
+    """
+    执行一个脚本（线程入口）
+    
+    参数:
+    sprite: 角色对象
+    flag: 脚本第一个积木的ID
+    
+    说明:
+    - STACK_INTERPRETER为False时直接交给递归的runcode
+    - 否则用一个显式的栈代替Python的调用栈：控制积木（STACK_CONTROL中的积木）
+      把循环体、分支和自定义积木的定义压栈，而不是递归调用runcode，
+      所以脚本嵌套和自定义积木递归的深度不受Python递归上限的限制
+    - 其他积木（包括报告积木的求值）仍然通过runcode执行，它们的嵌套深度是固定的
+    - 每执行一个积木检查一次done、取消令牌和克隆体是否已删除
+    - 循环每轮结束等到下一个逻辑帧（tick_signal），和Scratch一样；
+      在"运行时不刷新屏幕"的自定义积木中不等待
+    """
+    if not STACK_INTERPRETER:
+        runcode(sprite, flag)
+        return
+    token = current_token()
+    warp = 0  # 正在执行的"运行时不刷新屏幕"的自定义积木层数
+    stack = [(BLOCK, flag)]
+    while stack:
+        if done or token.cancelled or sprite.clone_mode == 2:
+            return
+        frame = stack.pop()
+        kind = frame[0]
+        if kind == BLOCK:
+            flag = frame[1]
+            if flag is None:
+                continue
+            block = sprite.blocks[flag]
+            if block.next is not None:
+                stack.append((BLOCK, block.next))
+            control = STACK_CONTROL.get(block.opcode)
+            if control is None:
+                runcode(sprite, flag, should_next=False)
+            else:
+                try:
+                    if control(sprite, flag, stack):
+                        warp += 1
+                except Exception:
+                    logging.error(f"执行积木{flag}时出错: {traceback.format_exc()}")
+        elif kind == REPEAT:
+            _, body, remaining = frame
+            if not warp:
+                tick_signal.wait(token)
+            if remaining > 0:
+                stack.append((REPEAT, body, remaining - 1))
+                stack.append((BLOCK, body))
+        elif kind == FOREVER:
+            if not warp:
+                tick_signal.wait(token)
+            stack.append(frame)
+            stack.append((BLOCK, frame[1]))
+        elif kind == RETURN:
+            if frame[2]:
+                warp -= 1
+            thread = threading.current_thread()
+            for name, value in frame[1].items():
+                if value is None:
+                    sprite.argument_dict.pop((thread, name), None)
+                else:
+                    sprite.argument_dict[(thread, name)] = value
+
+def stack_if(sprite: Sprite, flag: str, stack: list) -> None:
+    """如果...那么...：条件成立时把分支压栈"""
+    inputs = sprite.blocks[flag].inputs
+    condition = inputs.get("CONDITION", [None, None])[1]
+    if runcode(sprite, condition) == "True":
+        stack.append((BLOCK, inputs.get("SUBSTACK", [None, None])[1]))
+
+def stack_if_else(sprite: Sprite, flag: str, stack: list) -> None:
+    """如果...那么...否则...：按条件把其中一个分支压栈"""
+    inputs = sprite.blocks[flag].inputs
+    condition = inputs.get("CONDITION", [None, None])[1]
+    branch = "SUBSTACK" if runcode(sprite, condition) == "True" else "SUBSTACK2"
+    stack.append((BLOCK, inputs.get(branch, [None, None])[1]))
+
+def stack_repeat(sprite: Sprite, flag: str, stack: list) -> None:
+    """重复执行n次：次数只在进入循环时求值一次"""
+    body = sprite.blocks[flag].inputs.get("SUBSTACK", [None, None])[1]
+    times = safe_int(S_eval(sprite, flag)["TIMES"])
+    if body is not None and times > 0:
+        stack.append((REPEAT, body, times - 1))
+        stack.append((BLOCK, body))
+
+def stack_forever(sprite: Sprite, flag: str, stack: list) -> None:
+    """重复执行：每执行完一遍循环体等待一个逻辑帧"""
+    body = sprite.blocks[flag].inputs.get("SUBSTACK", [None, None])[1]
+    stack.append((FOREVER, body))
+    stack.append((BLOCK, body))
+
+def stack_procedures_call(sprite: Sprite, flag: str, stack: list) -> bool:
+    """
+    调用自定义积木
+    
+    返回:
+    bool: 是否是"运行时不刷新屏幕"的自定义积木
+    
+    说明:
+    - 设置参数后把定义压栈，定义下面压一个RETURN帧，
+      定义执行完时恢复调用前的参数，递归调用返回后外层的参数仍然正确
+    """
+    dic = S_eval(sprite, flag)
+    tagname = sprite.blocks[flag].mutation["proccode"]
+    if tagname not in sprite.procedures:
+        logging.error(f"没有找到自定义积木{tagname}的定义")
+        return False
+    definition, argument_names, warp = sprite.procedures[tagname]
+    thread = threading.current_thread()
+    saved = {}
+    for key, value in dic.items():
+        if key in argument_names:
+            name = argument_names[key]
+            saved[name] = sprite.argument_dict.get((thread, name))
+            sprite.argument_dict[(thread, name)] = value
+    stack.append((RETURN, saved, warp))
+    stack.append((BLOCK, definition))
+    return warp
+
+def stack_stop(sprite: Sprite, flag: str, stack: list) -> None:
+    """
+    停止积木
+    
+    说明:
+    - "this script"在自定义积木里和Scratch 3一样只从这个自定义积木返回（递归的终止条件常这样写）：
+      弹出栈直到最近的RETURN帧，RETURN帧留在栈顶，照常恢复参数和不刷新屏幕的层数
+    - 不在自定义积木里时取消令牌，结束整个脚本
+    - 其他选项交给control_stop
+    """
+    if sprite.blocks[flag].fields["STOP_OPTION"][0] != "this script":
+        sprite.control_stop(flag)
+        return
+    while stack:
+        if stack[-1][0] == RETURN:
+            return
+        stack.pop()
+    current_token().cancel()
+
+# 显式栈解释器中不通过runcode执行、而是操作栈的积木
+STACK_CONTROL = {
+    "control_if": stack_if,
+    "control_if_else": stack_if_else,
+    "control_repeat": stack_repeat,
+    "control_forever": stack_forever,
+    "procedures_call": stack_procedures_call,
+    "control_stop": stack_stop,
+}
+
+def missing_handler(opcode: str):
+    """
+    为没有实现的opcode创建处理函数
+    
+    参数:
+    opcode: 积木类型
+    
+    返回:
+    function: 什么都不做的处理函数，第一次执行时记录一条错误日志
+    """
+    logged = False
+
+    def handler(sprite: Sprite, flag: str) -> None:
+        nonlocal logged
+        if not logged:
+            logged = True
+            logging.error(f"缺少函数{opcode}，跳过{sprite.name}中的这个积木")
+    return handler
+
+def bind_handlers(sprites: list) -> None:
+    """
+    加载时检查所有积木的opcode
+    
+    参数:
+    sprites: 角色列表
+    
+    说明:
+    - 没有实现的opcode在这里一次性报告，并在Sprite.handlers中绑定到missing_handler，
+      运行时查表总能找到处理函数
+    """
+    missing = {block.opcode for sprite in sprites for block in sprite.blocks.values()
+               if block.opcode not in Sprite.handlers}
+    for opcode in missing:
+        Sprite.handlers[opcode] = missing_handler(opcode)
+    if missing:
+        logging.warning(f"以下积木没有实现，执行时会被跳过：{', '.join(sorted(missing))}")
+
 # 主程序从这里开始
 logging.info("开始程序")    
 pygame.init()
@@ -2044,129 +2786,385 @@ pygame.init()
 show_screen = pygame.display.set_mode(STAGE_SHOW_SIZE)
 screen = pygame.Surface(STAGE_SIZE)
 logging.info("初始化pygame")    
-with zipfile.ZipFile("project.sb3") as f:
-    filenamelist = f.namelist()
-    f.extractall()
+assets = AssetStore("project.sb3")  # 资源全部在内存中，不解压到当前目录
+asset_cache = None
+if ASSET_CACHE_DIR is not None:
+    try:
+        asset_cache = AssetCache(ASSET_CACHE_DIR, ASSET_CACHE_LIMIT)
+    except OSError as e:
+        logging.warning(f"无法使用资源缓存目录{ASSET_CACHE_DIR}: {e}")
 
-t = json.loads(open("project.json", "r", encoding="utf-8").read())
-logging.info("解析json文件")
 sprite_list = []  # 角色们
 clone_list = []
+sprite_by_name = {}  # 角色名 -> 原始角色，菜单类积木据此查找目标
+clones_by_name = {}  # 角色名 -> 存活的克隆体列表，创建和删除克隆体时更新
+monitor_list = []
 
 done = False  # done是用来标记程序是否运行，False代表运行，true代表结束
 clock = pygame.time.Clock()
+
+def runner_fingerprint() -> str:
+    """
+    运行器版本标识，作为项目缓存键的一部分
     
-for i in t["targets"]:
-    i["clone_mode"] = 0  # 0=原始, 1=克隆体, 2=已删除
-    sprite = Sprite(i)
-    sprite_list.append(sprite)
-
-
-    #提取角色的变量和列表
-    sprite.variables={}
-    sprite.lists={}
-    variables_name={}
-    #logging.debug(sprite.variables)
-
-    for j in i["variables"].items():
-        #logging.debug(j)
-        sprite.variables[j[0]]=safe_str(j[1][1])
-        variables_name[j[0]]=safe_str(j[1][0])
-    for j in i["lists"].items():
-        logging.debug(j)
-        listid=j[0]
-        listname=j[1][0]
-        list_name_to_id.update({(sprite,listname):listid})
-        thelist=j[1][1]
-        thelist=[safe_str(k) for k in thelist]
-        sprite.lists[j[0]]=thelist
-     
-    logging.info(f"提取{sprite}的变量"  )  
-    logging.debug(sprite.variables)
-    logging.debug(variables_name)
+    说明:
+    - 由RUNNER_VERSION和运行器源码的哈希组成，改了代码旧缓存自动失效
+    - 打包成exe后读不到源码，只使用RUNNER_VERSION
+    """
+    digest = hashlib.sha256(RUNNER_VERSION.encode())
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def prepare_project(text: str) -> dict:
+    """
+    把project.json的内容整理成运行时使用的对象
+    
+    参数:
+    text: project.json的文本
+    
+    返回:
+    dict: 整理好的项目，可以直接pickle进项目缓存
+    
+    说明:
+    - 逐个解析角色（见projectloader.iter_project），处理完一个释放一个原始字典，
+      不会同时持有整个项目的字典树
+    - 删除不会执行的积木（见analysis.prune_unreachable），
+      计算只有常量输入的运算积木（见analysis.fold_constants）
+    - 创建角色和舞台对象，提取变量和列表，建立名字索引和造型索引
+    - 创建变量和列表显示框
+    - 结果直接放进sprite_list等全局容器，同时返回这些容器供缓存
+    """
+    global stage
+    backdrops = {"names": set(), "sequential": False}  # 所有角色切换背景积木的汇总
+    monitors = []
+    pruned = Counter()  # 所有角色删除的积木，按opcode计数
+    for key, i in iter_project(text):
+        if key == "monitors":
+            monitors = i
+        if key != "target":
+            continue
+        compact_target(i)
+        removed = prune_unreachable(i["blocks"])
+        if removed:
+            logging.info(f"{i['name']}：删除了{sum(removed.values())}个不会执行的积木")
+            logging.debug(dict(removed))
+            pruned.update(removed)
+        predict_costumes(i, backdrops)
+        i["procedures"] = procedure_index(i["blocks"])
+        i["clone_mode"] = 0  # 0=原始, 1=克隆体, 2=已删除
+        sprite = Sprite(i)
+        sprite_list.append(sprite)
+        sprite_by_name[sprite.name] = sprite
+        folded = fold_constants(sprite.blocks, lambda flag: Sprite.handlers[sprite.blocks[flag].opcode](sprite, flag))
+        if folded:
+            logging.info(f"{sprite.name}：折叠了{folded}个常量运算积木")
+
+
+        #提取角色的变量和列表
+        sprite.variables={}
+        sprite.lists={}
+        variables_name={}
+        #logging.debug(sprite.variables)
+
+        for j in i["variables"].items():
+            #logging.debug(j)
+            sprite.variables[j[0]]=safe_str(j[1][1])
+            variables_name[j[0]]=safe_str(j[1][0])
+        for j in i["lists"].items():
+            logging.debug(j)
+            listid=j[0]
+            listname=j[1][0]
+            list_name_to_id.update({(sprite,listname):listid})
+            thelist=j[1][1]
+            thelist=[safe_str(k) for k in thelist]
+            sprite.lists[j[0]]=thelist
+         
+        logging.info(f"提取{sprite}的变量"  )  
+        logging.debug(sprite.variables)
+        logging.debug(variables_name)
+
+        if sprite.isStage:
+            stage = sprite
+
+        # 造型名 -> 索引，克隆体复制__dict__时共用同一个字典；重名时与Scratch一样取第一个
+        sprite.costume_index = {}
+        for index, costume in enumerate(sprite.costumes):
+            sprite.costume_index.setdefault(costume["name"], index)
+        del i  # 原始字典用完立即释放，角色只保留需要的部分
+
+    stage.predicted_costumes = costume_indices(stage.costumes, backdrops["names"])
+    stage.costume_sequential = backdrops["sequential"]
+    if pruned:
+        logging.info(f"共删除{sum(pruned.values())}个不会执行的积木：{dict(pruned.most_common())}")
+    logging.info("提取变量完成") 
+    logging.debug(list_name_to_id)         
+    for i in monitors:
+        monitor=Monitor(i)
+        monitor_list.append(monitor)
+    logging.info("创建显示框完成")
+    return {
+        "sprites": sprite_list,
+        "list_name_to_id": list_name_to_id,
+        "monitors": monitor_list,
+    }
 
-    if sprite.isStage:
-        stage = sprite
-        stage.time = time.time()
+def install_project(project: dict) -> None:
+    """
+    把从缓存中读出的项目放进全局容器
     
-    # 注册初始线程
+    参数:
+    project: prepare_project返回并被缓存的项目
+    """
+    global stage
+    sprite_list.extend(project["sprites"])
+    list_name_to_id.update(project["list_name_to_id"])
+    monitor_list.extend(project["monitors"])
+    for sprite in sprite_list:
+        sprite_by_name[sprite.name] = sprite
+        if sprite.isStage:
+            stage = sprite
+
+project_cache = None
+if PROJECT_CACHE_DIR is not None:
+    try:
+        project_cache = ProjectCache(PROJECT_CACHE_DIR)
+    except OSError as e:
+        logging.warning(f"无法使用项目缓存目录{PROJECT_CACHE_DIR}: {e}")
+fingerprint = runner_fingerprint()
+project = project_cache.load(assets.digest, fingerprint) if project_cache else None
+# project.json只读一次，读完从内存中释放；命中缓存时不需要解码，直接丢掉原始字节
+if project is not None:
+    assets.pop("project.json")
+    install_project(project)
+    logging.info("从项目缓存中加载")
+else:
+    text = assets.pop("project.json").decode("utf-8")  # 解码后原始字节已释放，解析时不同时持有字节和文本
+    project = prepare_project(text)
+    del text
+    logging.info("解析json文件")
+    if project_cache is not None:
+        project_cache.store(assets.digest, fingerprint, project)
+bind_handlers(sprite_list)
+stage.time = time.time()  # 计时器从这里开始
+
+preload_assets(sprite_list)  # 解码资源，同时计算每个造型的包围盒和凸包
+
+# 注册初始线程
+for sprite in sprite_list:
     for flag, code in sprite.blocks.items():
-        if code["opcode"] == "event_whenflagclicked":
-            thread = threading.Thread(
-                name=f"{sprite.name}_{flag}",
-                target=runcode,
-                args=(sprite, flag),
-                daemon=True
-            )
-            thread.start()
-            thread_manager.add_thread(thread)
-
-logging.info("提取变量完成") 
-logging.debug(list_name_to_id)         
-monitor_list=[]            
-for i in t["monitors"]:
-    monitor=Monitor(i)
-    monitor_list.append(monitor)
-logging.info("创建显示框完成")
+        if code.opcode == "event_whenflagclicked":
+            thread_manager.start_script(sprite, flag, f"{sprite.name}_{flag}")
+
 # 设置窗口标题
 pygame.display.set_caption("scratch")
 
+def publish_snapshot() -> None:
+    """
+    复制所有角色的可见状态和显示框的值，发布为渲染快照
+    
+    说明:
+    - 已删除的克隆体不进入快照
+    - 只复制可见显示框的值，列表复制成元组
+    """
+    snapshots.publish(Snapshot(
+        tick_signal.tick,
+        {i: i.state() for i in sprite_list+clone_list if i.clone_mode!=2},
+        {i: i.current_value() for i in monitor_list if i.visible},
+    ))
+
+def start_hats(sprite: Sprite, opcode: str) -> None:
+    """
+    启动角色中所有opcode类型的事件脚本
+    
+    参数:
+    sprite: 角色（或克隆体、舞台）
+    opcode: 事件积木的类型，如"event_whenthisspriteclicked"
+    """
+    for flag, code in sprite.blocks.items():
+        if code.opcode == opcode and code.next is not None:
+            thread_manager.start_script(sprite, code.next, f"{sprite}_{flag}")
+
+def sprite_at(x: float, y: float) -> "Sprite | None":
+    """
+    找到舞台上某个点最前面的角色
+    
+    参数:
+    x, y: Scratch坐标系中的点
+    
+    返回:
+    Sprite: 最前面的在这个点上有不透明像素的角色（可能是克隆体），没有时返回None
+    
+    说明:
+    - 按最近一次渲染的快照从前往后检查，用画出来的图像和位置（drawn，插值后的），
+      和玩家看到的画面一致，点击快速移动的角色也不会错过
+    - 隐藏的角色、已删除的克隆体和还没有绘制过的角色不参与
+    - 先比较矩形再检查缓存的遮罩，碰到第一个就停止（见collision.hit_test），
+      几百个克隆体时也只有矩形包含这个点的几个需要检查像素
+    """
+    current = snapshots.read()[1]
+    layers = (
+        (i, i.drawn[1], i.drawn[0]) for i, state in reversed(current.sprites.items())
+        if not i.isStage and state.visible and i.clone_mode != 2
+        and getattr(i, "drawn", None) is not None
+    )
+    return hit_test(layers, Position(x, y).pygame())
+
+class Drag:
+    """
+    正在拖动的角色
+    
+    属性:
+    - sprite: 被拖动的角色
+    - offset: 角色位置相对鼠标的偏移（Scratch坐标系），拖动时保持不变
+    - start: 按下鼠标的位置
+    - moved: 鼠标是否离开过按下的位置DRAG_THRESHOLD以上，没有移动过的拖动算作点击
+    """
+    
+    __slots__ = ("sprite", "offset", "start", "moved")
+    
+    def __init__(self, sprite: Sprite, x: float, y: float) -> None:
+        """从鼠标在(x, y)按下开始拖动sprite"""
+        self.sprite = sprite
+        self.offset = (sprite.x - x, sprite.y - y)
+        self.start = (x, y)
+        self.moved = False
+
+DRAG_THRESHOLD = 3  # 鼠标移动超过这个距离（Scratch单位）才开始拖动，和Scratch一样
+dragging = None  # 正在拖动的角色（Drag），没有时为None
+
+def dispatch_clicks(mouse) -> None:
+    """
+    分发这个逻辑帧的鼠标点击，并拖动角色
+    
+    参数:
+    mouse: 这个逻辑帧的输入快照（inputstate.InputState）
+    
+    说明:
+    - 每次点击只交给最前面被点中的角色，没有点中角色时算作点击舞台
+    - 不可拖动的角色按下时立即触发"当角色被点击"
+    - 可拖动的角色（draggable）按下后跟着鼠标移动，松开时如果没有移动过才算点击
+    - 只在主线程调用
+    """
+    global dragging
+    for x, y in mouse.clicks:
+        target = sprite_at(x, y)
+        if target is None:
+            start_hats(stage, "event_whenstageclicked")
+        elif getattr(target, "draggable", False):
+            dragging = Drag(target, x, y)
+        else:
+            start_hats(target, "event_whenthisspriteclicked")
+    if dragging is None:
+        return
+    drag = dragging
+    if drag.sprite.clone_mode == 2:  # 拖动中的克隆体被删除
+        dragging = None
+        return
+    if not drag.moved and math.hypot(mouse.mouse_x - drag.start[0],
+                                     mouse.mouse_y - drag.start[1]) > DRAG_THRESHOLD:
+        drag.moved = True
+    if drag.moved:
+        drag.sprite.x = mouse.mouse_x + drag.offset[0]
+        drag.sprite.y = mouse.mouse_y + drag.offset[1]
+    if not mouse.mouse_down:
+        dragging = None
+        if not drag.moved:
+            start_hats(drag.sprite, "event_whenthisspriteclicked")
+
+def logic_tick(now: float) -> None:
+    """
+    推进一个逻辑帧
+    
+    参数:
+    now: 这个逻辑帧的时间（time.monotonic）
+    
+    说明:
+    - 换一帧查询缓存，推进补间
+    - 发布渲染快照（角色的可见状态和显示框的值），渲染只读快照
+    - 按快照更新碰撞用的图像（见Sprite.update_hitbox），每个逻辑帧只算一次
+    - 唤醒在tick_signal上等待的脚本（循环的下一轮、等待直到）
+    - 按住或者上个逻辑帧以来按下过的键触发"当按下某键"脚本，两帧之间的短按不会丢失
+    - 分发鼠标点击（"当角色被点击"、"当舞台被点击"），拖动可拖动的角色
+    - 由主循环按固定步长调用，每秒正好TPS次，和渲染帧率无关
+    """
+    query_cache.next_frame()
+    timers.advance(now)
+    publish_snapshot()
+    for i, state in snapshots.read()[1].sprites.items():
+        i.update_hitbox(state)
+    tick_signal.advance()
+    keys = inputs.take_edges()
+    dispatch_clicks(keys)
+    if keys.keys_down or any(keys.keys):
+        for i in sprite_list+clone_list:
+            if i.clone_mode==2:#克隆体被删除
+                continue
+            for flag, code in i.blocks.items():
+                if code.opcode == "event_whenkeypressed":
+                    key = code.fields["KEY_OPTION"][0]
+                    if keys.key_pressed(key) or keys.key_hit(key):
+                        thread_manager.start_script(i, code.next, f"{i}_{flag}")
+
 # 渲染线程主循环
+# 逻辑帧用固定步长：累计实际经过的时间，每攒够1/TPS秒推进一个逻辑帧，
+# 渲染帧率快时有的帧不推进逻辑，慢时一帧推进好几个逻辑帧
 logging.info("进入主循环")
+logic_step = 1 / TPS
+logic_time = time.monotonic()  # 已经推进到的逻辑时间
+monitor_layer = pygame.Surface(STAGE_SIZE, pygame.SRCALPHA)  # 降低显示框刷新率时缓存显示框
+monitor_layer_valid = False
+publish_snapshot()  # 第一个逻辑帧之前也有快照可以渲染
 try:
     while not done:
-    # 处理事件        
-        event = pygame.event.poll()
-        #logging.debug(event)
-        if event.type != pygame.NOEVENT:
-            #print(event)
-            if event.type == pygame.KEYDOWN:
-                print(event.key)
-        if event.type == pygame.QUIT:
+        frame_start = time.monotonic()
+    # 处理事件：取出所有事件，更新输入快照
+        if inputs.poll():
             done = True
-        keys_pressed = pygame.key.get_pressed() 
-        if any(keys_pressed):
-            pass
-            #logging.debug(keys_pressed)
-            import keymap
-            for i in sprite_list+clone_list:
-                if i.clone_mode==2:#克隆体被删除
-                    continue
-                        
-                for flag, code in i.blocks.items():
-                    if code["opcode"] == "event_whenkeypressed":
-                        if keys_pressed[keymap.keymap[code["fields"]["KEY_OPTION"][0]]]:
-                            #logging.debug(code)
-                            flag = code["next"]
-                            thread = threading.Thread(
-                                name=str(i) + flag, target=runcode, args=(i, flag)
-                            )
-                            thread.start()
-                            # runcode(i,flag)
-
-            
 
-        
-                
+        # 推进逻辑帧
+        now = time.monotonic()
+        ticks = 0
+        while now - logic_time >= logic_step:
+            if ticks == MAX_TICKS_PER_FRAME:
+                load_shedder.drop_ticks(int((now - logic_time) / logic_step))
+                logic_time = now  # 落后太多，丢掉积压的逻辑帧
+                break
+            logic_time += logic_step
+            logic_tick(logic_time)
+            ticks += 1
+        alpha = min((now - logic_time) / logic_step, 1.0)  # 渲染插值的比例
 
-    
+        if not load_shedder.should_render():
+            clock.tick(FPS)  # 过载时隔帧渲染，逻辑照常推进
+            continue
 
         # 填充窗口颜色
         screen.fill((255, 255, 255))
 
         # 逐个角色更新窗口
         
-        for i in sprite_list+clone_list:
-            if i.clone_mode==2:#克隆体被删除
-                continue
-            
-            i.draw() 
+        # 只读快照，不读脚本线程正在修改的角色属性
+        previous, current = snapshots.read()
+        previous_sprites = previous.sprites if previous is not None else {}
+        for i, state in current.sprites.items():
+            i.draw(state, previous_sprites.get(i), alpha) 
 
                 
                 
-        for i in monitor_list:
-
-            i.draw() 
+        if load_shedder.monitor_interval == 1:
+            for i, value in current.monitors.items():
+                i.draw(value)
+            monitor_layer_valid = False
+        else:
+            # 过载时显示框隔几帧才重画一次，其余帧贴上次画好的结果
+            if load_shedder.should_redraw_monitors() or not monitor_layer_valid:
+                monitor_layer.fill((0, 0, 0, 0))
+                for i, value in current.monitors.items():
+                    i.draw(value, monitor_layer)
+                monitor_layer_valid = True
+            screen.blit(monitor_layer, (0, 0))
      
 
             # 更新窗口
@@ -2177,6 +3175,7 @@ try:
         
 
         pygame.display.update()
+        load_shedder.record(time.monotonic() - frame_start)
             
         clock.tick(FPS)
 
@@ -2189,15 +3188,8 @@ except Exception as e:
 finally:
     # 优雅退出
     logging.warning("退出程序")
+    logging.info(f"过载统计: {load_shedder.stats()}，旋转缓存命中{rotation_cache.hits}次，未命中{rotation_cache.misses}次")
     done = True
     thread_manager.stop_all_threads()
+    decode_pool.shutdown(wait=False, cancel_futures=True)
     pygame.quit()
-    
-    # 清理临时文件
-    for filename in filenamelist:
-        if logging.getLogger().level <= logging.DEBUG:
-            break
-        try:
-            os.remove(filename)
-        except:
-            pass
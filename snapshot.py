@@ -0,0 +1,72 @@
+from typing import NamedTuple
+
+
+class SpriteState(NamedTuple):
+    """
+    一个角色在某个逻辑帧的可见状态（不可变）
+
+    属性:
+    - x, y: Scratch坐标系中的位置，舞台为0
+    - direction: 方向，舞台为None
+    - size: 大小（百分比），舞台为None
+    - costume: 造型索引
+    - visible: 是否可见，舞台总是可见
+    - words: 说话内容
+    """
+    x: float
+    y: float
+    direction: float
+    size: float
+    costume: int
+    visible: bool
+    words: str
+
+
+class Snapshot:
+    """
+    一个逻辑帧的渲染快照（不可变）
+
+    脚本线程一直在修改角色的位置、造型和列表内容，渲染时直接读这些属性
+    可能看到改了一半的角色，遍历列表时列表还可能被另一个线程修改。
+    每个逻辑帧主循环把渲染需要的状态复制一份，渲染只读快照。
+
+    属性:
+    - tick: 逻辑帧序号
+    - sprites: {角色: SpriteState}，按绘制顺序（从后往前）排列
+    - monitors: {显示框: 显示的值}，列表显示框的值是元组
+    """
+
+    __slots__ = ("tick", "sprites", "monitors")
+
+    def __init__(self, tick: int, sprites: dict, monitors: dict) -> None:
+        """初始化快照，参数含义见类说明"""
+        self.tick = tick
+        self.sprites = sprites
+        self.monitors = monitors
+
+
+class SnapshotBuffer:
+    """
+    快照的双缓冲
+
+    保存最近两个逻辑帧的快照，渲染时在两者之间插值。
+    publish只替换一个属性（一对快照的元组），read只读取这个属性，
+    Python中这两个操作都是原子的，渲染和发布都不需要加锁。
+    """
+
+    def __init__(self) -> None:
+        """初始化，还没有快照时两个都是None"""
+        self._pair = (None, None)
+
+    def publish(self, snapshot: Snapshot) -> None:
+        """发布新的快照，原来的当前快照变成上一个快照"""
+        self._pair = (self._pair[1], snapshot)
+
+    def read(self) -> tuple:
+        """
+        读取快照
+
+        返回:
+        (上一个快照, 当前快照)，还没有发布过时为None
+        """
+        return self._pair
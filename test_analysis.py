@@ -0,0 +1,125 @@
+"""
+analysis中加载时改写积木的几个分析的测试
+
+这些分析原地修改积木字典，结果会被pickle进项目缓存，出错时每次启动都会读到错的积木。
+"""
+
+from block import Block
+from analysis import prune_unreachable, fold_constants
+
+
+def literal(value) -> list:
+    """输入框里直接写的常量"""
+    return [1, [10, str(value)]]
+
+
+def evaluator(blocks: dict):
+    """
+    代替解释器计算常量积木的函数，只支持测试用到的运算
+
+    说明:
+    - 和解释器一样返回字符串，除以0时抛出异常
+    """
+    operations = {
+        "operator_add": lambda a, b: a + b,
+        "operator_multiply": lambda a, b: a * b,
+        "operator_divide": lambda a, b: a / b,
+        "operator_lt": lambda a, b: a < b,
+    }
+
+    def evaluate(flag):
+        block = blocks[flag]
+        a, b = (float(block.inputs[name][1][1]) for name in sorted(block.inputs))
+        return str(operations[block.opcode](a, b))
+    return evaluate
+
+
+def test_fold_nested_constants():
+    # say ((60) * ((1) + (2)))
+    blocks = {
+        "hat": Block("event_whenflagclicked", next="say"),
+        "say": Block("looks_say", parent="hat", inputs={"MESSAGE": [3, "multiply", [10, ""]]}),
+        "multiply": Block("operator_multiply", parent="say",
+                          inputs={"NUM1": literal(60), "NUM2": [3, "add", [4, ""]]}),
+        "add": Block("operator_add", parent="multiply", inputs={"NUM1": literal(1), "NUM2": literal(2)}),
+    }
+    assert fold_constants(blocks, evaluator(blocks)) == 2
+    assert set(blocks) == {"hat", "say"}
+    assert blocks["say"].inputs["MESSAGE"] == literal(180.0)
+
+
+def test_fold_skips_random():
+    blocks = {
+        "say": Block("looks_say", inputs={"MESSAGE": [3, "random", [10, ""]]}),
+        "random": Block("operator_random", parent="say", inputs={"FROM": literal(1), "TO": literal(10)}),
+    }
+    assert fold_constants(blocks, evaluator(blocks)) == 0
+    assert set(blocks) == {"say", "random"}
+    assert blocks["say"].inputs["MESSAGE"] == [3, "random", [10, ""]]
+
+
+def test_fold_skips_boolean_inputs():
+    # 如果 <(1) < (2)> 那么：条件输入必须放积木，不能换成常量
+    blocks = {
+        "if": Block("control_if", inputs={"CONDITION": [2, "lt"]}),
+        "lt": Block("operator_lt", parent="if", inputs={"OPERAND1": literal(1), "OPERAND2": literal(2)}),
+    }
+    assert fold_constants(blocks, evaluator(blocks)) == 0
+    assert set(blocks) == {"if", "lt"}
+    assert blocks["if"].inputs["CONDITION"] == [2, "lt"]
+
+
+def test_fold_keeps_division_by_zero():
+    # say ((1) + ((1) / (0)))：出错的积木和包含它的积木都保留，运行时照常报错
+    blocks = {
+        "say": Block("looks_say", inputs={"MESSAGE": [3, "add", [10, ""]]}),
+        "add": Block("operator_add", parent="say", inputs={"NUM1": literal(1), "NUM2": [3, "divide", [4, ""]]}),
+        "divide": Block("operator_divide", parent="add", inputs={"NUM1": literal(1), "NUM2": literal(0)}),
+    }
+    assert fold_constants(blocks, evaluator(blocks)) == 0
+    assert set(blocks) == {"say", "add", "divide"}
+    assert blocks["add"].inputs["NUM2"] == [3, "divide", [4, ""]]
+
+
+def test_prune_drops_loose_scripts():
+    blocks = {
+        "hat": Block("event_whenflagclicked", next="say"),
+        "say": Block("looks_say", parent="hat", inputs={"MESSAGE": literal("hi")}),
+        # 代码区里没有帽子的零散脚本和单独放着的报告积木
+        "loose": Block("motion_movesteps", next="loose2", inputs={"STEPS": literal(10)}),
+        "loose2": Block("motion_turnright", parent="loose", inputs={"DEGREES": literal(15)}),
+        "reporter": Block("operator_add", inputs={"NUM1": literal(1), "NUM2": literal(2)}),
+    }
+    removed = prune_unreachable(blocks)
+    assert set(blocks) == {"hat", "say"}
+    assert removed == {"motion_movesteps": 1, "motion_turnright": 1, "operator_add": 1}
+
+
+def test_prune_keeps_procedure_prototype_and_arguments():
+    blocks = {
+        "define": Block("procedures_definition", next="body", inputs={"custom_block": [1, "prototype"]}),
+        "prototype": Block("procedures_prototype", parent="define", shadow=True,
+                           inputs={"arg_id": [1, "argument"]},
+                           mutation={"proccode": "jump %s", "argumentids": '["arg_id"]'}),
+        "argument": Block("argument_reporter_string_number", parent="prototype", shadow=True,
+                          fields={"VALUE": ["height", None]}),
+        "body": Block("motion_changeyby", parent="define", inputs={"DY": [3, "use", [4, "10"]]}),
+        "use": Block("argument_reporter_string_number", parent="body", fields={"VALUE": ["height", None]}),
+    }
+    removed = prune_unreachable(blocks)
+    assert set(blocks) == {"define", "prototype", "argument", "body", "use"}
+    assert not removed
+
+
+def test_prune_drops_obscured_shadows():
+    blocks = {
+        "hat": Block("event_whenflagclicked", next="say"),
+        "say": Block("looks_say", parent="hat", inputs={"MESSAGE": [3, "answer", "shadow"]}),
+        "answer": Block("sensing_answer", parent="say"),
+        # 被answer盖住的输入框，不会被执行
+        "shadow": Block("text", parent="say", shadow=True, fields={"TEXT": ["hello", None]}),
+    }
+    removed = prune_unreachable(blocks)
+    assert set(blocks) == {"hat", "say", "answer"}
+    assert blocks["say"].inputs["MESSAGE"] == [3, "answer"]
+    assert removed == {"text": 1}
@@ -0,0 +1,146 @@
+"""
+解释器的端到端测试
+
+scratch.py导入时就会加载project.sb3并进入主循环，所以每个测试在临时目录里生成一个小项目，
+用子进程运行：驱动线程等脚本跑完后读出变量，再结束主循环。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+PACKAGE = os.path.dirname(os.path.abspath(__file__))
+
+COSTUME = '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"><rect width="10" height="10"/></svg>'
+
+# 等变量达到预期值（或超时）后打印所有变量，然后结束主循环
+DRIVER = """
+import json, sys, threading, time
+sys.path.insert(0, {package!r})
+expected = json.loads({expected!r})
+def driver():
+    while "scratch" not in sys.modules or not hasattr(sys.modules["scratch"], "logic_tick"):
+        time.sleep(0.05)
+    scratch = sys.modules["scratch"]
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and dict(scratch.stage.variables) != expected:
+        time.sleep(0.05)
+    time.sleep(0.2)  # 多等几帧，确认没有多执行的积木
+    print("VARIABLES " + json.dumps(scratch.stage.variables))
+    scratch.done = True
+threading.Thread(target=driver, daemon=True).start()
+import scratch
+"""
+
+
+class Script:
+    """拼积木用的小工具，积木ID按顺序编号"""
+
+    def __init__(self) -> None:
+        self.blocks = {}
+
+    def add(self, opcode, inputs=None, fields=None, parent=None, **extra) -> str:
+        flag = f"b{len(self.blocks)}"
+        self.blocks[flag] = dict({"opcode": opcode, "next": None, "parent": parent,
+                                  "inputs": inputs or {}, "fields": fields or {},
+                                  "shadow": False, "topLevel": parent is None}, **extra)
+        return flag
+
+    def chain(self, *flags) -> str:
+        """把积木依次接起来，返回第一个"""
+        for first, second in zip(flags, flags[1:]):
+            self.blocks[first]["next"] = second
+            self.blocks[second]["parent"] = first
+        return flags[0]
+
+    def set_variable(self, name, value) -> str:
+        return self.add("data_setvariableto", {"VALUE": [1, [10, str(value)]]}, {"VARIABLE": [name, name]})
+
+    def change_variable(self, name, value) -> str:
+        return self.add("data_changevariableby", {"VALUE": [1, [4, str(value)]]}, {"VARIABLE": [name, name]})
+
+    def stop_this_script(self) -> str:
+        return self.add("control_stop", fields={"STOP_OPTION": ["this script", None]},
+                        mutation={"tagName": "mutation", "children": [], "hasnext": "false"})
+
+
+def run_project(tmp_path, blocks, variables, expected) -> dict:
+    """
+    生成只有一个角色的项目并运行
+
+    参数:
+    blocks: 角色的积木
+    variables: 舞台变量的初始值{变量ID: 值}，变量名和ID相同
+    expected: 脚本跑完后的变量值，达到后提前结束
+
+    返回:
+    dict: 结束时的舞台变量
+    """
+    costume = {"name": "c", "assetId": "c", "md5ext": "c.svg", "dataFormat": "svg",
+               "rotationCenterX": 5, "rotationCenterY": 5}
+    common = {"costumes": [costume], "sounds": [], "currentCostume": 0, "lists": {},
+              "broadcasts": {}, "comments": {}, "volume": 100, "layerOrder": 0}
+    stage = dict(common, isStage=True, name="Stage", blocks={},
+                 variables={name: [name, value] for name, value in variables.items()})
+    sprite = dict(common, isStage=False, name="A", blocks=blocks, variables={}, layerOrder=1,
+                  visible=True, x=0, y=0, size=100, direction=90, draggable=False,
+                  rotationStyle="all around")
+    project = {"targets": [stage, sprite], "monitors": [], "extensions": [], "meta": {"semver": "3.0.0"}}
+    with zipfile.ZipFile(tmp_path / "project.sb3", "w") as archive:
+        archive.writestr("project.json", json.dumps(project))
+        archive.writestr("c.svg", COSTUME)
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", HOME=str(tmp_path))
+    driver = DRIVER.format(package=PACKAGE, expected=json.dumps(expected))
+    result = subprocess.run([sys.executable, "-c", driver], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    for line in result.stdout.splitlines():
+        if line.startswith("VARIABLES "):
+            return json.loads(line[len("VARIABLES "):])
+    raise AssertionError(result.stdout[-2000:] + result.stderr[-2000:])
+
+
+def test_stop_this_script_returns_from_procedure(tmp_path):
+    # 定义 f (n)：如果 n < 1 那么 停止这个脚本；v增加100；f (n - 1)；v增加1
+    # 当绿旗被点击：v设为0；f (3)；v增加1000  —— Scratch 3中结果是1303
+    script = Script()
+    mutation = {"tagName": "mutation", "children": [], "proccode": "f %s",
+                "argumentids": '["n"]', "argumentnames": '["n"]', "argumentdefaults": '[""]', "warp": "false"}
+
+    def argument(parent=None):
+        return script.add("argument_reporter_string_number", fields={"VALUE": ["n", None]}, parent=parent)
+
+    definition = script.add("procedures_definition")
+    prototype = script.add("procedures_prototype", parent=definition, shadow=True, mutation=mutation)
+    script.blocks[prototype]["inputs"] = {"n": [1, argument(prototype)]}
+    script.blocks[definition]["inputs"] = {"custom_block": [1, prototype]}
+
+    condition = script.add("operator_lt", {"OPERAND1": [3, argument(), [10, ""]], "OPERAND2": [1, [10, "1"]]})
+    stop = script.stop_this_script()
+    check = script.add("control_if", {"CONDITION": [2, condition], "SUBSTACK": [2, stop]})
+    script.blocks[stop]["parent"] = script.blocks[condition]["parent"] = check
+    minus = script.add("operator_subtract", {"NUM1": [3, argument(), [4, ""]], "NUM2": [1, [4, "1"]]})
+    recurse = script.add("procedures_call", {"n": [3, minus, [10, ""]]}, mutation=mutation)
+    script.chain(definition, check, script.change_variable("v", 100), recurse, script.change_variable("v", 1))
+
+    call = script.add("procedures_call", {"n": [1, [10, "3"]]}, mutation=mutation)
+    script.chain(script.add("event_whenflagclicked"), script.set_variable("v", 0), call,
+                 script.change_variable("v", 1000))
+
+    variables = run_project(tmp_path, script.blocks, {"v": 0}, {"v": "1303"})
+    assert float(variables["v"]) == 1303
+
+
+def test_stop_this_script_ends_top_level_script(tmp_path):
+    # 当绿旗被点击：w设为1；停止这个脚本；w设为2  —— 停在1
+    script = Script()
+    script.chain(script.add("event_whenflagclicked"), script.set_variable("w", 1),
+                 script.stop_this_script(), script.set_variable("w", 2))
+
+    variables = run_project(tmp_path, script.blocks, {"w": 0}, {"w": "1"})
+    assert variables["w"] == "1"
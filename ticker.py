@@ -0,0 +1,51 @@
+import threading
+
+
+class TickSignal:
+    """
+    逻辑帧信号
+
+    主循环每一帧调用advance，需要"每帧检查一次"的脚本线程在wait中阻塞到下一帧。
+    用来代替忙等：等待直到积木每帧只计算一次条件，其余时间线程挂起，
+    不占用GIL，也不会拖慢渲染。
+
+    说明:
+    - 所有等待的线程共用一个条件变量，advance一次唤醒全部
+    - wait只在帧号改变或者脚本的令牌被取消时返回，没有超时，
+      一帧很慢时循环也不会多跑；程序退出时所有令牌被取消，等待的脚本随之醒来
+    """
+
+    def __init__(self) -> None:
+        """初始化信号，帧号从0开始"""
+        self.tick = 0
+        self._condition = threading.Condition()
+
+    def advance(self) -> None:
+        """进入下一帧，唤醒所有等待的线程"""
+        with self._condition:
+            self.tick += 1
+            self._condition.notify_all()
+
+    def _wake(self) -> None:
+        """唤醒所有等待的线程，让它们重新检查令牌"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self, token) -> int:
+        """
+        阻塞到下一帧开始
+
+        参数:
+        token: 脚本的取消令牌（cancel.CancelToken），被取消时立即返回
+
+        返回:
+        int: 醒来时的帧号
+        """
+        token.on_cancel(self._wake)
+        try:
+            with self._condition:
+                tick = self.tick
+                self._condition.wait_for(lambda: self.tick != tick or token.cancelled)
+                return self.tick
+        finally:
+            token.remove_callback(self._wake)
@@ -0,0 +1,136 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class Tween:
+    """
+    补间 - 一个持续一段时间的动作（滑行、等待、说话几秒）
+
+    属性:
+    - start: 开始时间（逻辑帧时间，见TimerHeap）
+    - duration: 持续时间（秒）
+    - end: 结束时间
+    - update: 每帧调用的函数，参数是已经完成的比例（0到1），没有时为None
+    - done: 是否已经结束（到时间或被取消）
+    - cancelled: 是否被取消
+    """
+
+    __slots__ = ("start", "duration", "end", "update", "done", "cancelled", "_event")
+
+    def __init__(self, start: float, duration: float, update=None) -> None:
+        """初始化补间，参数含义见类说明"""
+        self.start = start
+        self.duration = duration
+        self.end = start + duration
+        self.update = update
+        self.done = False
+        self.cancelled = False
+        self._event = threading.Event()
+
+    def step(self, now: float) -> None:
+        """按经过的时间更新，由TimerHeap在主循环中调用"""
+        if self.done or self.update is None:
+            return
+        fraction = (now - self.start) / self.duration if self.duration > 0 else 1.0
+        self.update(min(max(fraction, 0.0), 1.0))
+
+    def finish(self) -> None:
+        """到达结束时间：最后更新一次到终点，然后唤醒等待的脚本"""
+        if self.done:
+            return
+        if self.update is not None:
+            self.update(1.0)
+        self.done = True
+        self._event.set()
+
+    def cancel(self) -> None:
+        """取消补间，停在当前状态并唤醒等待的脚本"""
+        self.cancelled = True
+        self.done = True
+        self._event.set()
+
+    def wait(self, token) -> bool:
+        """
+        在脚本线程中等待补间结束
+
+        参数:
+        token: 脚本的取消令牌（cancel.CancelToken），令牌被取消时补间也被取消
+
+        返回:
+        bool: 正常结束返回True，被取消返回False
+        """
+        token.on_cancel(self.cancel)
+        self._event.wait()
+        token.remove_callback(self.cancel)
+        return not self.cancelled
+
+
+class TimerHeap:
+    """
+    计时器堆 - 集中管理所有补间，由主循环按帧推进
+
+    以前每个限时积木在自己的线程里sleep很多次（滑行分100步），
+    步数固定、受线程调度影响，时间不准，线程切换也很多。
+    现在脚本线程只登记一个补间然后挂起，主循环每帧调用一次advance：
+    - 有update的补间（滑行）按经过的时间插值，动作平滑且和实际帧率一致
+    - 到时间的补间从堆顶弹出，更新到终点后唤醒脚本，每个补间只唤醒一次
+
+    说明:
+    - 按结束时间排成最小堆，每帧只检查堆顶
+    - 补间在到时间后的第一帧结束，和Scratch中限时积木在帧边界结束一样
+    - 补间的开始时间取最近一次advance的逻辑帧时间，和advance用同一个时钟；
+      逻辑帧时间比实际时间晚（追赶时晚好几帧），用time.monotonic会让进度变成负数
+    """
+
+    def __init__(self) -> None:
+        """初始化空的计时器堆"""
+        self._heap = []  # (结束时间, 序号, 补间)，序号保证结束时间相同时按登记顺序
+        self._moving = []  # 需要每帧更新的补间
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.now = None  # 最近一次advance的时间，第一次advance之前为None
+
+    def __len__(self) -> int:
+        """未结束的补间数量"""
+        return len(self._heap)
+
+    def add(self, duration: float, update=None) -> Tween:
+        """
+        登记一个补间
+
+        参数:
+        duration: 持续时间（秒），不大于0时在下一帧结束
+        update: 每帧调用的函数，参数是已经完成的比例（0到1）
+
+        返回:
+        Tween: 登记好的补间，脚本线程调用它的wait等待结束
+        """
+        start = self.now if self.now is not None else time.monotonic()
+        tween = Tween(start, max(duration, 0.0), update)
+        with self._lock:
+            heapq.heappush(self._heap, (tween.end, next(self._counter), tween))
+            if update is not None:
+                self._moving.append(tween)
+        return tween
+
+    def advance(self, now: float) -> None:
+        """
+        推进到指定时间，由主循环每帧调用一次
+
+        参数:
+        now: 当前逻辑帧的时间（time.monotonic的时钟）
+        """
+        with self._lock:
+            self.now = now
+            due = []
+            while self._heap and (self._heap[0][0] <= now or self._heap[0][2].done):
+                due.append(heapq.heappop(self._heap)[2])
+            moving = self._moving
+            if due and moving:
+                self._moving = [tween for tween in moving if not tween.done and tween not in due]
+        for tween in moving:
+            tween.step(now)
+        for tween in due:
+            tween.finish()